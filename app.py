@@ -1,33 +1,209 @@
-from flask import Flask, request, jsonify, Response, send_file
+from flask import Flask, request, jsonify, Response, send_file, g
 from flask_cors import CORS
-import yt_dlp
 import os
-import tempfile
 import json
-import requests
 from urllib.parse import urlparse, unquote
 import re
 import logging
 from datetime import datetime
 import threading
 import time
+import copy
+import gzip
+import hashlib
+import math
+import queue
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip
+    brotli = None
+from info_cache import create_info_cache, cache_key
+from jobs import create_job_manager, JobQueueFull
+from ratelimit import create_rate_limiter, RateLimited
+from failures import (
+    create_negative_cache, create_circuit_breakers, classify_error, ErrorRecorder, CircuitOpen, CONTENT_ERRORS
+)
+from progress_store import create_progress_store
+from oembed import fetch_oembed
+from lazy import LazyModule
+from ydl_pool import create_ydl_pool, format_selection
+from cookies import create_cookie_store
+from artifacts import create_artifact_cache
+from scratch import create_scratch_space, InsufficientStorage
+from segmented import create_segment_tuner, fetch_segmented, SegmentedFetchError
+from audio import (
+    create_audio_pipeline, plan_audio, parse_audio_accept, parse_audio_bitrate, AudioRequest, TranscodeFailed
+)
+from metrics import Registry, DURATION_BUCKETS
+from profiler import create_profiler
+from thumbnails import (
+    create_http_session, create_thumbnail_cache, create_derived_cache,
+    can_resize, negotiate_format, clamp_dimension, resize_image, IMAGE_FORMATS
+)
+
+# yt-dlp (~0.2s to import) loads on the first extraction, not on every cold start
+yt_dlp = LazyModule('yt_dlp')
 
 app = Flask(__name__)
 CORS(app)
 
+# Number of reverse proxies in front of the app whose X-Forwarded-For is trusted
+# for the client address (Vercel's edge sets it)
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 1 if os.environ.get('VERCEL') == '1' else 0))
+if TRUSTED_PROXIES:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variables for download progress tracking
-download_progress = {}
+# Prometheus metrics served at /metrics (per worker process)
+metrics = Registry()
+request_latency = metrics.histogram(
+    'mdl_request_seconds', 'Time to build the response', ('endpoint', 'method', 'status')
+)
+extraction_latency = metrics.histogram(
+    'mdl_extraction_seconds', 'yt-dlp metadata extraction latency', ('extractor',)
+)
+download_duration = metrics.histogram(
+    'mdl_download_seconds', 'Time to produce a download file', ('kind', 'source'), DURATION_BUCKETS
+)
+bytes_served = metrics.counter('mdl_bytes_served_total', 'Response body bytes sent', ('endpoint',))
+info_lite_latency = metrics.histogram(
+    'mdl_info_lite_seconds', 'Time to answer phase one of /api/info/lite', ('source',)
+)
+extraction_failures = metrics.counter(
+    'mdl_extraction_failures_total', 'Failed extractions by error class', ('extractor', 'error_class')
+)
+
+# Flame data for slow requests when PROFILE_SLOW_REQUESTS is set (see profiler.py)
+profiler = create_profiler()
+
+# Download progress shared with the job API (see progress_store.py for settings)
+progress_store = create_progress_store()
+
+# Minimum seconds between progress writes for one download
+PROGRESS_WRITE_INTERVAL = float(os.environ.get('PROGRESS_WRITE_INTERVAL', 0.5))
+
+# How often the job event stream checks for progress updates
+JOB_EVENT_INTERVAL = 0.5
+
+# Version of the /api/info response layout; bump when fields change meaning
+INFO_SCHEMA_VERSION = 2
+PROJECTION_KEY = '_mdl_projection'
+# Heavy info fields only returned when requested via ?fields=
+OPTIONAL_INFO_FIELDS = ('description', 'thumbnails')
+# Smaller JSON bodies aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Response keys that change between identical lookups; left out of the ETag
+VOLATILE_RESPONSE_KEYS = ('cached', 'followup_token')
+
+# Limits for /api/info/batch
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 25))
+BATCH_ITEM_TIMEOUT = float(os.environ.get('BATCH_ITEM_TIMEOUT', 30))
+BATCH_TIMEOUT = float(os.environ.get('BATCH_TIMEOUT', 120))
+
+# Extractions for batch requests share one bounded pool across all requests
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_WORKERS', 4)), thread_name_prefix='batch-info'
+)
+
+# /api/info/lite answers from the site's oEmbed endpoint when it has one
+# (see oembed.py) before falling back to an unprocessed yt-dlp extraction
+INFO_LITE_OEMBED = os.environ.get('INFO_LITE_OEMBED', '1') != '0'
+# Card fields returned by phase one of /api/info/lite
+LITE_INFO_FIELDS = ('id', 'title', 'uploader', 'duration', 'thumbnail', 'extractor', 'webpage_url')
+
+# Full extractions started by /api/info/lite finish here after its response is sent
+info_prefetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('INFO_PREFETCH_WORKERS', 4)), thread_name_prefix='info-prefetch'
+)
+
+# Chunk size for proxied media streams
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Largest thumbnail the proxy will relay or cache
+THUMBNAIL_MAX_BYTES = int(os.environ.get('THUMBNAIL_MAX_BYTES', 5 * 1024 * 1024))
+THUMBNAIL_MAX_AGE = 3600
+THUMBNAIL_CHUNK_SIZE = 16 * 1024
+
+# Shared, connection-pooled HTTP session for outbound media and thumbnail requests.
+# Built on first use so routes that never fetch anything don't import requests.
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = create_http_session()
+    return _http_session
+
+# Parallel fragment downloads for DASH/HLS formats (yt-dlp's -N)
+CONCURRENT_FRAGMENTS = int(os.environ.get('CONCURRENT_FRAGMENTS', 4))
+
+# Only register these extractors (comma-separated yt-dlp names or regexes, e.g.
+# "youtube,youtube:tab,vimeo,generic"); building a YoutubeDL with a short list
+# is several times faster than registering all ~1800. Unset means all of them.
+ALLOWED_EXTRACTORS = tuple(name.strip() for name in os.environ.get('ALLOWED_EXTRACTORS', '').split(',') if name.strip()) or None
+
+# Fetch progressive video files over several Range requests (see segmented.py for settings)
+SEGMENTED_DOWNLOADS = os.environ.get('SEGMENTED_DOWNLOADS', '0') == '1'
+segment_tuner = create_segment_tuner()
+
+# ffmpeg stage for audio downloads, fed while the source is fetched (see audio.py for settings)
+audio_pipeline = create_audio_pipeline()
+
+# Disk cache of proxied thumbnails (see thumbnails.py for settings)
+thumbnail_cache = create_thumbnail_cache()
+derived_cache = create_derived_cache()
+
+# cookies.txt parsed once and shared by all YoutubeDL instances (see cookies.py)
+cookie_store = create_cookie_store()
+
+# Reusable YoutubeDL instances for extraction (see ydl_pool.py for settings)
+ydl_pool = create_ydl_pool(prepare=cookie_store.attach)
+
+# Shared cache of extracted video metadata (see info_cache.py for settings)
+info_cache = create_info_cache()
+
+# Recent extraction failures and per-site circuit breakers (see failures.py for settings)
+negative_cache = create_negative_cache()
+circuit_breakers = create_circuit_breakers()
+# Captures why an extraction returned None (yt-dlp only logs it with ignoreerrors)
+extraction_errors = ErrorRecorder()
+
+# Finished downloads reused across requests for the same video and format (see artifacts.py)
+artifact_cache = create_artifact_cache()
+
+# Quota-bound working directories for downloads in progress (see scratch.py for settings)
+scratch_space = create_scratch_space()
+
+# Per-client and per-extractor request budgets (see ratelimit.py for settings)
+rate_limiter = create_rate_limiter()
 
 class ProgressHook:
-    def __init__(self, download_id):
+    def __init__(self, download_id, min_interval=PROGRESS_WRITE_INTERVAL):
         self.download_id = download_id
+        self.min_interval = min_interval
+        self.last_write = 0
+        self.last_status = None
     
     def __call__(self, d):
-        if d['status'] == 'downloading':
+        # yt-dlp calls this many times per second; only write status changes
+        # and at most one 'downloading' update per interval
+        now = time.monotonic()
+        status = d['status']
+        if status == self.last_status and now - self.last_write < self.min_interval:
+            return
+        
+        if status == 'downloading':
             progress = {
                 'status': 'downloading',
                 'downloaded_bytes': d.get('downloaded_bytes', 0),
@@ -35,12 +211,17 @@ class ProgressHook:
                 'speed': d.get('speed', 0),
                 'eta': d.get('eta', 0)
             }
-            download_progress[self.download_id] = progress
-        elif d['status'] == 'finished':
-            download_progress[self.download_id] = {
+        elif status == 'finished':
+            progress = {
                 'status': 'finished',
                 'filename': d.get('filename', '')
             }
+        else:
+            return
+        
+        progress_store.set(self.download_id, progress)
+        self.last_write = now
+        self.last_status = status
 
 def get_ydl_opts(output_path=None, format_selector=None, cookies=None):
     """Get yt-dlp options with common settings"""
@@ -54,10 +235,15 @@ def get_ydl_opts(output_path=None, format_selector=None, cookies=None):
         'writesubtitles': False,
         'writeautomaticsub': False,
         'ignoreerrors': True,
+        'concurrent_fragment_downloads': CONCURRENT_FRAGMENTS,
+        'logger': extraction_errors,
         'no_check_certificate': True,
         'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     
+    if ALLOWED_EXTRACTORS:
+        opts['allowed_extractors'] = list(ALLOWED_EXTRACTORS)
+    
     if output_path:
         opts['outtmpl'] = output_path
     
@@ -69,14 +255,418 @@ def get_ydl_opts(output_path=None, format_selector=None, cookies=None):
     
     return opts
 
+def extract_sanitized(ydl, url, ie_result=None, process=True):
+    """extract_info + sanitize_info, timed per extractor for /metrics.
+
+    A URL that failed recently returns None again without extracting (see
+    failures.py), and a site whose circuit breaker is open raises
+    CircuitOpen instead of being contacted.
+    
+    With process=False only the site's extractor runs and its raw result is
+    returned unsanitized (see extract_lite). Passing that result back as
+    ie_result resolves its formats without extracting the page again.
+    """
+    key = cache_key(url, ALLOWED_EXTRACTORS)
+    if negative_cache.get(key) is not None:
+        logger.debug("Negative cache hit for %s", url)
+        return None
+    site = extractor_name(url)
+    probe = circuit_breakers.before(site)
+    
+    start = time.perf_counter()
+    extractor = key.split(':', 1)[0]
+    error = None
+    ok = False
+    extraction_errors.pop()
+    try:
+        if ie_result is not None:
+            try:
+                info = ydl.process_ie_result(ie_result, download=False)
+            except yt_dlp.utils.ExtractorError as e:
+                # extract_info only logs these under ignoreerrors; fail the same way
+                error = str(e)
+                info = None
+        else:
+            info = ydl.extract_info(url, download=False, process=process)
+        ok = info is not None
+        extractor = (info or {}).get('extractor_key') or extractor
+        if not ok:
+            error = error or extraction_errors.pop()
+            if classify_error(error) == 'format':
+                # A problem with the request, not the video: report it instead of returning None
+                raise yt_dlp.utils.ExtractorError(error.removeprefix('ERROR: '), expected=True)
+        if not process:
+            return info
+        return ydl.sanitize_info(info, remove_private_keys=True)
+    except yt_dlp.DownloadError as e:
+        error = str(e)
+        raise
+    finally:
+        if process:
+            # Unprocessed extractions are timed as part of /api/info/lite instead
+            extraction_latency.observe(time.perf_counter() - start, extractor)
+        if not ok:
+            error = error or extraction_errors.pop()
+        if ok or classify_error(error) == 'format':
+            # The site answered; an unavailable format is neither cached nor held against it
+            circuit_breakers.after(site, True, probe)
+        else:
+            record_extraction_failure(key, site, error, probe)
+
+def record_extraction_failure(key, site, message, probe=False):
+    """Negative-cache a failed extraction and count it against the site unless the video itself is the problem"""
+    error_class = classify_error(message)
+    ttl = negative_cache.add(key, error_class, message)
+    circuit_breakers.after(site, error_class in CONTENT_ERRORS, probe)
+    extraction_failures.inc(site, error_class)
+    logger.info("Extraction of %s failed (%s), not retrying for %ss", key, error_class, ttl)
+
+def failure_reason(url):
+    """Error class of url's most recent failed extraction, if it is still remembered"""
+    failure = negative_cache.peek(cache_key(url, ALLOWED_EXTRACTORS))
+    return failure[0] if failure else None
+
+def circuit_open_response(error):
+    retry_after = max(1, math.ceil(error.retry_after))
+    response = jsonify({'error': f'{error.name} is currently failing, please try again later', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def extract_video_info(url, ydl_opts):
+    """Run a full yt-dlp extraction and return a JSON-safe info dict (or None)"""
+    # Answer known failures and open breakers before taking a YoutubeDL from the pool
+    if negative_cache.get(cache_key(url, ALLOWED_EXTRACTORS)) is not None:
+        return None
+    circuit_breakers.check(extractor_name(url))
+    with ydl_pool.checkout(ydl_opts) as ydl:
+        logger.debug("Starting yt-dlp extraction for URL: %s", url)
+        return extract_sanitized(ydl, url)
+
+def extract_lite(url, ydl_opts):
+    """Unprocessed yt-dlp result for url (or None): the extractor runs, format selection doesn't.
+
+    Keep the result for complete_info(), which finishes it without
+    contacting the site's page again.
+    """
+    with ydl_pool.checkout(ydl_opts) as ydl:
+        logger.debug("Starting unprocessed yt-dlp extraction for URL: %s", url)
+        return extract_sanitized(ydl, url, process=False)
+
+def complete_info(url, ydl_opts, ie_result=None):
+    """Full JSON-safe info dict for url, resolved from extract_lite()'s result when there is one"""
+    if ie_result is None:
+        return extract_video_info(url, ydl_opts)
+    with ydl_pool.checkout(ydl_opts) as ydl:
+        return extract_sanitized(ydl, url, ie_result=ie_result)
+
+def lite_info(info, url):
+    """The card fields of a full, unprocessed or oEmbed info dict"""
+    lite = {field: info.get(field) for field in LITE_INFO_FIELDS}
+    lite['webpage_url'] = lite['webpage_url'] or url
+    if not lite['thumbnail'] and info.get('thumbnails'):
+        # Unprocessed results only have the list; yt-dlp picks 'thumbnail' while processing
+        lite['thumbnail'] = info['thumbnails'][-1].get('url')
+    return lite
+
+def resolve_lite_info(url, ydl_opts):
+    """Phase one of /api/info/lite: (card info, source, unprocessed result or None).
+
+    Card info is None when the extraction failed.
+    """
+    # Known failures and open breakers are answered before anything goes out
+    if negative_cache.get(cache_key(url, ALLOWED_EXTRACTORS)) is not None:
+        return None, None, None
+    circuit_breakers.check(extractor_name(url))
+    
+    if INFO_LITE_OEMBED:
+        data = fetch_oembed(get_http_session(), url)
+        if data:
+            return lite_info(data, url), 'oembed', None
+    
+    ie_result = extract_lite(url, ydl_opts)
+    if ie_result is None:
+        return None, None, None
+    return lite_info(ie_result, url), 'extractor', ie_result
+
+def start_full_info(url, ydl_opts, ie_result=None):
+    """Phase two of /api/info/lite: fill the info cache for url in the background.
+
+    The load is registered with the info cache before this returns, so the
+    client's follow-up /api/info call waits for it instead of extracting
+    again. On serverless hosts, where work after the response may be
+    frozen, clients should use /api/info/lite/events instead.
+    """
+    try:
+        future = info_cache.load_in_background(
+            cache_key(url, ALLOWED_EXTRACTORS), lambda: complete_info(url, ydl_opts, ie_result),
+            info_prefetch_executor
+        )
+    except RuntimeError as e:
+        logger.warning("Could not start background extraction of %s: %s", url, e)
+        return
+    if future is not None:
+        future.add_done_callback(log_prefetch_error)
+
+def log_prefetch_error(future):
+    error = future.exception()
+    # Failed extractions are already logged and negative-cached; only report the unexpected
+    if error is not None and not isinstance(error, (CircuitOpen, yt_dlp.DownloadError)):
+        logger.error("Background extraction failed (%s): %s", type(error).__name__, error)
+
+def load_info(ydl, url):
+    """Info dict for url from the info cache (shared between workers with INFO_CACHE_DB) or a fresh extraction"""
+    info, _ = info_cache.get_or_load(
+        cache_key(url, ALLOWED_EXTRACTORS), lambda: extract_sanitized(ydl, url)
+    )
+    return info
+
+def download_with_info(ydl, url, segmented=False):
+    """Download url with a single extraction pass.
+
+    The info dict comes from the info cache, where a recent /api/info call
+    for the same video left it, and is handed straight to
+    process_ie_result so yt-dlp does not extract the page a second time.
+    With segmented, progressive HTTP formats are fetched over parallel Range
+    requests instead of yt-dlp's single stream.
+
+    Returns (info, file_path); file_path is None if yt-dlp wrote no file.
+    """
+    info = load_info(ydl, url)
+    if info is None:
+        return None, None
+    
+    if segmented:
+        file_path = download_segmented(ydl, url, info)
+        if file_path:
+            return info, file_path
+    
+    # process_ie_result mutates the dict, so never hand it the cached copy
+    result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+    for requested in (result or {}).get('requested_downloads', []):
+        file_path = requested.get('filepath')
+        if file_path and os.path.isfile(file_path):
+            return info, file_path
+    
+    # Media URLs in the reused info may have expired: drop it and fall back to a
+    # fresh extraction, whose info replaces the stale entry for later downloads
+    logger.warning("Download from reused info failed, re-extracting: %s", url)
+    key = cache_key(url, ALLOWED_EXTRACTORS)
+    info_cache.delete(key)
+    fresh = ydl.extract_info(url, download=True)
+    if fresh is None:
+        return info, None
+    info = ydl.sanitize_info(fresh, remove_private_keys=True)
+    info_cache.set(key, info)
+    for requested in fresh.get('requested_downloads', []):
+        file_path = requested.get('filepath')
+        if file_path and os.path.isfile(file_path):
+            return info, file_path
+    return info, None
+
+def format_request_headers(ydl, fmt, url):
+    """HTTP headers (including cookies) yt-dlp would send for the selected format"""
+    headers = dict(fmt.get('http_headers') or {})
+    cookie_header = ydl.cookiejar.get_cookie_header(fmt.get('url') or url)
+    if cookie_header:
+        headers['Cookie'] = cookie_header
+    return headers
+
+def is_progressive(fmt):
+    """A single HTTP file with both video and audio, which can be fetched (or proxied) directly"""
+    return (
+        not fmt.get('requested_formats')
+        and fmt.get('protocol') in ('http', 'https')
+        and fmt.get('vcodec') != 'none'
+        and fmt.get('acodec') != 'none'
+    )
+
+def download_segmented(ydl, url, info):
+    """Fetch the selected format over parallel Range requests; returns the file path or None"""
+    fmt = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    if not fmt or not is_progressive(fmt):
+        return None
+    file_path = ydl.prepare_filename(fmt)
+    host = urlparse(fmt['url']).hostname or ''
+    segments = segment_tuner.segments(host)
+    hooks = list(ydl.params.get('progress_hooks') or []) + [segment_tuner.hook(host, segments)]
+    try:
+        size = fetch_segmented(get_http_session(), fmt['url'], format_request_headers(ydl, fmt, url),
+                               file_path, segments, hooks)
+    except SegmentedFetchError as e:
+        logger.warning("Segmented download failed, falling back to yt-dlp: %s", e)
+        size = None
+    if size is None:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return None
+    logger.debug("Fetched %s bytes in %s segments from %s", size, segments, host)
+    return file_path
+
+def new_ydl(ydl_opts):
+    """A YoutubeDL outside the pool, using the shared cookie jar"""
+    return cookie_store.attach(yt_dlp.YoutubeDL(ydl_opts))
+
+def get_info_ydl_opts():
+    """yt-dlp options for metadata extraction.
+
+    cookies.txt is deliberately not passed as cookiefile; cookie_store
+    attaches the already parsed jar to each instance instead.
+    """
+    return get_ydl_opts()
+
+def project_info(info, url):
+    """Compact projection of an info dict, classifying formats in a single pass.
+
+    The result is memoized on the (cached) info dict, so repeat lookups of a
+    popular video skip the format walk entirely.
+    """
+    projection = info.get(PROJECTION_KEY)
+    if projection and projection.get('schema') == INFO_SCHEMA_VERSION:
+        return projection
+    
+    video_by_height = {}
+    audio_by_abr = {}
+    for fmt in info.get('formats') or ():
+        acodec = fmt.get('acodec')
+        if acodec == 'none':
+            continue
+        vcodec = fmt.get('vcodec')
+        if vcodec != 'none':
+            # Muxed video+audio: keep the first format seen for each height
+            height = fmt.get('height')
+            if height and height not in video_by_height:
+                fps = fmt.get('fps')
+                video_by_height[height] = {
+                    'format_id': fmt['format_id'],
+                    'quality': f"{height}p{fps}" if fps else f"{height}p",
+                    'height': height,
+                    'width': fmt.get('width'),
+                    'ext': fmt.get('ext', 'mp4'),
+                    'filesize': fmt.get('filesize'),
+                    'fps': fps,
+                    'vcodec': vcodec,
+                    'acodec': acodec
+                }
+        else:
+            abr = fmt.get('abr')
+            if abr and abr not in audio_by_abr:
+                audio_by_abr[abr] = {
+                    'format_id': fmt['format_id'],
+                    'quality': f"{int(abr)}kbps",
+                    'abr': abr,
+                    'ext': fmt.get('ext', 'mp3'),
+                    'filesize': fmt.get('filesize'),
+                    'acodec': acodec
+                }
+    
+    video_formats = [video_by_height[h] for h in sorted(video_by_height, reverse=True)[:10]]
+    audio_formats = [audio_by_abr[a] for a in sorted(audio_by_abr, reverse=True)[:6]]
+    
+    # If no separate audio formats, create standard audio options
+    if not audio_formats:
+        audio_formats = [
+            {'quality': '320kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
+            {'quality': '256kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
+            {'quality': '192kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
+            {'quality': '128kbps', 'format_id': 'bestaudio', 'ext': 'mp3'}
+        ]
+    
+    description = info.get('description') or ''
+    projection = {
+        'schema': INFO_SCHEMA_VERSION,
+        'info': {
+            'id': info.get('id', ''),
+            'title': info.get('title', 'Unknown Title'),
+            'uploader': info.get('uploader', 'Unknown Uploader'),
+            'duration': info.get('duration', 0),
+            'view_count': info.get('view_count', 0),
+            'like_count': info.get('like_count', 0),
+            'upload_date': info.get('upload_date', ''),
+            'extractor': info.get('extractor', ''),
+            'webpage_url': info.get('webpage_url', url),
+            'thumbnail': info.get('thumbnail', ''),
+            # Only sent when asked for with ?fields=
+            'description': description[:500] + '...' if description else '',
+            'thumbnails': [
+                {'url': t['url'], 'width': t.get('width'), 'height': t.get('height')}
+                for t in info.get('thumbnails') or () if t.get('url')
+            ]
+        },
+        'formats': {
+            'video': video_formats,
+            'audio': audio_formats
+        }
+    }
+    info[PROJECTION_KEY] = projection
+    return projection
+
+def select_fields(data, fields):
+    """Keep only the requested dotted paths, e.g. ['formats.video', 'info.title']"""
+    selected = {key: data[key] for key in ('success', 'schema', 'cached') if key in data}
+    for path in fields:
+        source, target = data, selected
+        parts = path.split('.')
+        for i, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if i == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return selected
+
+def build_info_response(info, url, cached=False, fields=None):
+    """Turn an extracted info dict into the /api/info response payload.
+
+    Without fields, everything except the optional heavy fields
+    (description, full thumbnail list) is returned.
+    """
+    projection = project_info(info, url)
+    response_data = {
+        'success': True,
+        'schema': projection['schema'],
+        'cached': cached,
+        'info': projection['info'],
+        'formats': projection['formats']
+    }
+    if fields:
+        return select_fields(response_data, fields)
+    
+    response_data['info'] = {k: v for k, v in projection['info'].items() if k not in OPTIONAL_INFO_FIELDS}
+    return response_data
+
+def compressed_json_response(data, status=200):
+    """JSON response with a weak ETag (304 on match) and gzip/brotli when the client accepts it.
+
+    The ETag covers everything but VOLATILE_RESPONSE_KEYS, so a repeat
+    lookup of an unchanged video revalidates even though it is now cached.
+    """
+    body = json.dumps(data, separators=(',', ':')).encode()
+    stable = {key: value for key, value in data.items() if key not in VOLATILE_RESPONSE_KEYS}
+    digest = hashlib.sha1(json.dumps(stable, separators=(',', ':'), sort_keys=True).encode()).hexdigest()
+    etag = f'W/"{digest}"'
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+    
+    if status == 200 and etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if len(body) >= COMPRESS_MIN_BYTES:
+        if brotli is not None and 'br' in accept_encoding:
+            body = brotli.compress(body, quality=5)
+            headers['Content-Encoding'] = 'br'
+        elif 'gzip' in accept_encoding:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+    
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
 @app.route('/api/info', methods=['POST'])
 def get_video_info():
     """Get video information and available formats"""
     try:
-        logger.info("API /info endpoint called")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request content type: {request.content_type}")
-        logger.info(f"Request headers: {dict(request.headers)}")
+        logger.debug("API /info endpoint called (%s %s)", request.method, request.content_type)
         
         # Handle different request formats (JSON, form data, or query params)
         url = None
@@ -86,25 +676,25 @@ def get_video_info():
         if request.is_json:
             try:
                 data = request.get_json()
-                logger.info(f"JSON data received: {data}")
+                logger.debug("JSON data received: %s", data)
                 if data:
                     url = data.get('url', '').strip()
                     cookies = data.get('cookies')
             except Exception as e:
-                logger.error(f"JSON parsing error: {str(e)}")
-                logger.error(f"Raw request data: {request.get_data()}")
+                logger.error("JSON parsing error: %s", e)
+                logger.debug("Raw request data: %r", request.get_data())
         
         # If no URL from JSON, try form data
         if not url:
             url = request.form.get('url', '').strip()
-            logger.info(f"Form data URL: {url}")
+            logger.debug("Form data URL: %s", url)
         
         # If still no URL, try query parameters
         if not url:
             url = request.args.get('url', '').strip()
-            logger.info(f"Query param URL: {url}")
+            logger.debug("Query param URL: %s", url)
         
-        logger.info(f"Final URL extracted: {url}")
+        logger.debug("Final URL extracted: %s", url)
         
         if not url:
             logger.error("No URL provided in request")
@@ -112,161 +702,534 @@ def get_video_info():
         
         # Validate URL
         if not re.match(r'^https?://', url):
-            logger.error(f"Invalid URL format: {url}")
+            logger.error("Invalid URL format: %s", url)
             return jsonify({'error': 'Invalid URL format'}), 400
         
-        # In Vercel serverless environment, disable cookies entirely to avoid file system issues
-        # Check if we're in a serverless environment (Vercel sets VERCEL environment variable)
-        is_vercel = os.environ.get('VERCEL') == '1'
+        # The follow-up to /api/info/lite was charged there; its pass works once
+        followup = request.args.get('followup_token') or (request.get_json(silent=True) or {}).get('followup_token')
+        if not rate_limiter.redeem_pass(followup, cache_key(url, ALLOWED_EXTRACTORS)):
+            limited = check_rate_limit('info', [url])
+            if limited:
+                return limited
         
-        if is_vercel:
-            logger.info("Running in Vercel serverless environment - disabling cookies")
-            ydl_opts = get_ydl_opts()  # No cookies
-        else:
-            # Local environment - try to use cookies.txt if it exists
-            cookies_path = 'cookies.txt'
-            logger.info(f"Checking for cookies file at: {cookies_path}")
-            logger.info(f"Current working directory: {os.getcwd()}")
-            logger.info(f"Files in current directory: {os.listdir('.')}")
-            
-            if os.path.exists(cookies_path):
-                logger.info(f"Found cookies.txt file, size: {os.path.getsize(cookies_path)} bytes")
-                ydl_opts = get_ydl_opts(cookies=cookies_path)
-            else:
-                logger.warning("cookies.txt file not found, proceeding without cookies")
-                ydl_opts = get_ydl_opts()
+        ydl_opts = get_info_ydl_opts()
 
         # Note: In Vercel serverless environment, we can't create temporary files
         # so we ignore any cookies passed in the request and use the deployed cookies.txt
         if cookies:
-            logger.info("Cookies provided in request, but using deployed cookies.txt instead (serverless limitation)")
+            logger.debug("Cookies provided in request, but using deployed cookies.txt instead (serverless limitation)")
             # Still use the existing ydl_opts which may already have cookies.txt configured
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                logger.info(f"Starting yt-dlp extraction for URL: {url}")
-                logger.info(f"yt-dlp options: {ydl_opts}")
-                
-                info = ydl.extract_info(url, download=False)
-                logger.info("yt-dlp extraction completed successfully")
-                
-                # Check if extraction actually succeeded
-                if info is None:
-                    logger.error("yt-dlp returned None - video extraction failed (likely due to authentication requirements)")
-                    return jsonify({
-                        'error': 'Video extraction failed. This may be due to authentication requirements or the video being unavailable.',
-                        'success': False
-                    }), 400
-                
-                # Extract basic video information
-                video_info = {
-                    'id': info.get('id', ''),
-                    'title': info.get('title', 'Unknown Title'),
-                    'uploader': info.get('uploader', 'Unknown Uploader'),
-                    'duration': info.get('duration', 0),
-                    'view_count': info.get('view_count', 0),
-                    'like_count': info.get('like_count', 0),
-                    'description': info.get('description', '')[:500] + '...' if info.get('description', '') else '',
-                    'upload_date': info.get('upload_date', ''),
-                    'extractor': info.get('extractor', ''),
-                    'webpage_url': info.get('webpage_url', url),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'thumbnails': info.get('thumbnails', [])
-                }
-                
-                logger.info(f"Extracted video info: {video_info['title']} by {video_info['uploader']}")
-                
-                # Extract video formats
-                video_formats = []
-                audio_formats = []
-                
-                formats = info.get('formats', [])
-                logger.info(f"Found {len(formats)} total formats")
-                
-                # Process video formats
-                seen_video_qualities = set()
-                for fmt in formats:
-                    if fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none':
-                        height = fmt.get('height')
-                        if height and height not in seen_video_qualities:
-                            quality_label = f"{height}p"
-                            if fmt.get('fps'):
-                                quality_label += f"{fmt['fps']}"
-                            
-                            video_formats.append({
-                                'format_id': fmt['format_id'],
-                                'quality': quality_label,
-                                'height': height,
-                                'width': fmt.get('width'),
-                                'ext': fmt.get('ext', 'mp4'),
-                                'filesize': fmt.get('filesize'),
-                                'fps': fmt.get('fps'),
-                                'vcodec': fmt.get('vcodec'),
-                                'acodec': fmt.get('acodec')
-                            })
-                            seen_video_qualities.add(height)
-                
-                # Process audio formats
-                seen_audio_qualities = set()
-                for fmt in formats:
-                    if fmt.get('acodec') != 'none' and fmt.get('vcodec') == 'none':
-                        abr = fmt.get('abr')
-                        if abr and abr not in seen_audio_qualities:
-                            audio_formats.append({
-                                'format_id': fmt['format_id'],
-                                'quality': f"{int(abr)}kbps",
-                                'abr': abr,
-                                'ext': fmt.get('ext', 'mp3'),
-                                'filesize': fmt.get('filesize'),
-                                'acodec': fmt.get('acodec')
-                            })
-                            seen_audio_qualities.add(abr)
-                
-                # Sort formats by quality
-                video_formats.sort(key=lambda x: x.get('height', 0), reverse=True)
-                audio_formats.sort(key=lambda x: x.get('abr', 0), reverse=True)
-                
-                logger.info(f"Processed {len(video_formats)} video formats and {len(audio_formats)} audio formats")
-                
-                # If no separate audio formats, create standard audio options
-                if not audio_formats:
-                    audio_formats = [
-                        {'quality': '320kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
-                        {'quality': '256kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
-                        {'quality': '192kbps', 'format_id': 'bestaudio', 'ext': 'mp3'},
-                        {'quality': '128kbps', 'format_id': 'bestaudio', 'ext': 'mp3'}
-                    ]
-                    logger.info("Added default audio formats")
-                
-                response_data = {
+        try:
+            info, cached = info_cache.get_or_load(
+                cache_key(url, ALLOWED_EXTRACTORS), lambda: extract_video_info(url, ydl_opts)
+            )
+            logger.debug("Info cache %s for URL: %s", 'hit' if cached else 'miss', url)
+            
+            # Check if extraction actually succeeded
+            if info is None:
+                logger.error("yt-dlp returned None - video extraction failed (likely due to authentication requirements)")
+                return jsonify({
+                    'error': 'Video extraction failed. This may be due to authentication requirements or the video being unavailable.',
+                    'reason': failure_reason(url),
+                    'success': False
+                }), 400
+            
+            fields = request.args.get('fields') or (request.get_json(silent=True) or {}).get('fields')
+            fields = [f.strip() for f in fields.split(',') if f.strip()] if isinstance(fields, str) else None
+            response_data = build_info_response(info, url, cached, fields)
+            
+            logger.debug("Prepared response for %s", url)
+            return compressed_json_response(response_data)
+            
+        except CircuitOpen as e:
+            return circuit_open_response(e)
+        except yt_dlp.DownloadError as e:
+            logger.error("yt-dlp error (%s): %s", type(e).__name__, e)
+            return jsonify({'error': f'Failed to extract video info: {str(e)}'}), 400
+        except Exception as e:
+            logger.exception("Extraction error (%s): %s", type(e).__name__, e)
+            return jsonify({'error': f'Failed to process video: {str(e)}'}), 500
+            
+    except Exception as e:
+        logger.exception("General error (%s): %s", type(e).__name__, e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def request_url():
+    """url from the JSON body, form or query string"""
+    data = request.get_json(silent=True) or {}
+    return (data.get('url') or request.form.get('url') or request.args.get('url') or '').strip()
+
+@app.route('/api/info/lite', methods=['GET', 'POST'])
+def get_video_info_lite():
+    """Phase one of a two-phase info lookup: card metadata (title, uploader, duration, thumbnail) fast.
+
+    Answered from the site's oEmbed endpoint or an unprocessed extraction
+    while the full extraction continues in the background, reusing what
+    this phase resolved. Fetch the formats with /api/info and the returned
+    followup_token; that call joins the background extraction and, once,
+    isn't charged against the rate limit again. When the full
+    info is already cached it is returned right away with phase "full".
+    """
+    url = request_url()
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if not re.match(r'^https?://', url):
+        return jsonify({'error': 'Invalid URL format'}), 400
+    
+    limited = check_rate_limit('info', [url])
+    if limited:
+        return limited
+    
+    key = cache_key(url, ALLOWED_EXTRACTORS)
+    info = info_cache.get(key)
+    if info is not None:
+        return compressed_json_response(dict(build_info_response(info, url, cached=True), phase='full'))
+    
+    start = time.perf_counter()
+    ydl_opts = get_info_ydl_opts()
+    try:
+        lite, source, ie_result = resolve_lite_info(url, ydl_opts)
+    except CircuitOpen as e:
+        return circuit_open_response(e)
+    except yt_dlp.DownloadError as e:
+        logger.error("yt-dlp error (%s): %s", type(e).__name__, e)
+        return jsonify({'error': f'Failed to extract video info: {str(e)}'}), 400
+    except Exception as e:
+        logger.exception("Extraction error (%s): %s", type(e).__name__, e)
+        return jsonify({'error': f'Failed to process video: {str(e)}'}), 500
+    if lite is None:
+        return jsonify({
+            'error': 'Video extraction failed. This may be due to authentication requirements or the video being unavailable.',
+            'reason': failure_reason(url),
+            'success': False
+        }), 400
+    info_lite_latency.observe(time.perf_counter() - start, source)
+    
+    start_full_info(url, ydl_opts, ie_result)
+    return compressed_json_response({
+        'success': True,
+        'schema': INFO_SCHEMA_VERSION,
+        'phase': 'lite',
+        'source': source,
+        'followup_token': rate_limiter.issue_pass(key),
+        'info': lite
+    })
+
+@app.route('/api/info/lite/events')
+def info_lite_events():
+    """Both phases of /api/info/lite over one Server-Sent Events stream.
+
+    Sends a "lite" event with the card metadata, then a "full" event with
+    the /api/info payload, or an "error" event. Everything happens within
+    the request, so this also works where background work is frozen.
+    """
+    url = request_url()
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if not re.match(r'^https?://', url):
+        return jsonify({'error': 'Invalid URL format'}), 400
+    
+    limited = check_rate_limit('info', [url])
+    if limited:
+        return limited
+    
+    key = cache_key(url, ALLOWED_EXTRACTORS)
+    ydl_opts = get_info_ydl_opts()
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+    
+    def generate():
+        ie_result = None
+        try:
+            if info_cache.get(key) is None:
+                start = time.perf_counter()
+                lite, source, ie_result = resolve_lite_info(url, ydl_opts)
+                if lite is None:
+                    yield event('error', {'error': 'Video extraction failed', 'reason': failure_reason(url)})
+                    return
+                info_lite_latency.observe(time.perf_counter() - start, source)
+                yield event('lite', {
                     'success': True,
-                    'info': video_info,
-                    'formats': {
-                        'video': video_formats[:10],  # Limit to top 10 video formats
-                        'audio': audio_formats[:6]    # Limit to top 6 audio formats
-                    }
-                }
-                
-                logger.info("Successfully prepared response data")
-                return jsonify(response_data)
-                
-            except yt_dlp.DownloadError as e:
-                logger.error(f"yt-dlp error: {str(e)}")
-                logger.error(f"yt-dlp error type: {type(e)}")
-                return jsonify({'error': f'Failed to extract video info: {str(e)}'}), 400
-            except Exception as e:
-                logger.error(f"Extraction error: {str(e)}")
-                logger.error(f"Extraction error type: {type(e)}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                return jsonify({'error': f'Failed to process video: {str(e)}'}), 500
-                
+                    'schema': INFO_SCHEMA_VERSION,
+                    'phase': 'lite',
+                    'source': source,
+                    'info': lite
+                })
+            
+            info, cached = info_cache.get_or_load(key, lambda: complete_info(url, ydl_opts, ie_result))
+            if info is None:
+                yield event('error', {'error': 'Video extraction failed', 'reason': failure_reason(url)})
+                return
+            yield event('full', dict(build_info_response(info, url, cached), phase='full'))
+        except CircuitOpen as e:
+            yield event('error', {'error': str(e), 'retry_after': max(1, math.ceil(e.retry_after))})
+        except yt_dlp.DownloadError as e:
+            yield event('error', {'error': f'Failed to extract video info: {str(e)}'})
+        except Exception as e:
+            logger.exception("Extraction error (%s): %s", type(e).__name__, e)
+            yield event('error', {'error': 'Failed to process video'})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def extract_batch_item(url, ydl_opts):
+    """Info response for one batch entry; errors are reported in the item, not raised"""
+    if not re.match(r'^https?://', url or ''):
+        return {'success': False, 'error': 'Invalid URL format'}
+    try:
+        info, cached = info_cache.get_or_load(
+            cache_key(url, ALLOWED_EXTRACTORS), lambda: extract_video_info(url, ydl_opts)
+        )
+    except CircuitOpen as e:
+        return {'success': False, 'error': str(e), 'retry_after': max(1, math.ceil(e.retry_after))}
+    except yt_dlp.DownloadError as e:
+        return {'success': False, 'error': f'Failed to extract video info: {str(e)}'}
+    if info is None:
+        return {
+            'success': False,
+            'error': 'Video extraction failed. This may be due to authentication requirements or the video being unavailable.',
+            'reason': failure_reason(url)
+        }
+    return build_info_response(info, url, cached)
+
+def expand_playlist(playlist_url, ydl_opts):
+    """Cheap flat pass over a playlist: entry URLs without extracting each entry"""
+    flat_opts = dict(ydl_opts, extract_flat='in_playlist', playlistend=BATCH_MAX_ITEMS)
+    with ydl_pool.checkout(flat_opts) as ydl:
+        result = ydl.extract_info(playlist_url, download=False)
+    if not result:
+        return None, []
+    if result.get('_type') not in ('playlist', 'multi_video'):
+        return None, [playlist_url]
+    urls = []
+    for entry in result.get('entries') or []:
+        entry_url = entry and (entry.get('webpage_url') or entry.get('url'))
+        if entry_url and re.match(r'^https?://', entry_url):
+            urls.append(entry_url)
+    return {'title': result.get('title'), 'id': result.get('id')}, urls[:BATCH_MAX_ITEMS]
+
+@app.route('/api/info/batch', methods=['POST'])
+def get_batch_info():
+    """Get info for several URLs or a playlist, streamed as NDJSON.
+
+    Body: {"urls": [...]} or {"playlist": "<url>"}. Entries are extracted in
+    parallel and each line is written as soon as its entry finishes; entries
+    that run longer than BATCH_ITEM_TIMEOUT are reported as timed out.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        urls = data.get('urls')
+        playlist_url = (data.get('playlist') or '').strip()
+        
+        if playlist_url:
+            if not re.match(r'^https?://', playlist_url):
+                return jsonify({'error': 'Invalid URL format'}), 400
+        elif not isinstance(urls, list) or not urls:
+            return jsonify({'error': 'urls (list) or playlist is required'}), 400
+        elif len(urls) > BATCH_MAX_ITEMS:
+            return jsonify({'error': f'At most {BATCH_MAX_ITEMS} URLs per batch'}), 400
+        
+        # Every entry costs an extraction, so a batch is charged per URL
+        limited = check_rate_limit('info', [playlist_url] if playlist_url else [str(u).strip() for u in urls])
+        if limited:
+            return limited
+        
+        ydl_opts = get_info_ydl_opts()
+        playlist = None
+        if playlist_url:
+            playlist, urls = expand_playlist(playlist_url, ydl_opts)
+            if not urls:
+                return jsonify({'error': 'Failed to extract playlist'}), 400
+        urls = [str(u).strip() for u in urls]
+        if playlist_url:
+            limited = check_rate_limit('info', urls)
+            if limited:
+                return limited
+        
+    except yt_dlp.DownloadError as e:
+        return jsonify({'error': f'Failed to extract playlist: {str(e)}'}), 400
     except Exception as e:
-        logger.error(f"General error: {str(e)}")
-        logger.error(f"General error type: {type(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error("Batch info error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
+    
+    def generate():
+        results = queue.Queue()
+        started = {}
+        
+        def run(index, url):
+            started[index] = time.monotonic()
+            try:
+                item = extract_batch_item(url, ydl_opts)
+            except Exception as e:
+                item = {'success': False, 'error': f'Failed to process video: {str(e)}'}
+            results.put((index, item))
+        
+        futures = [batch_executor.submit(run, i, url) for i, url in enumerate(urls)]
+        pending = set(range(len(urls)))
+        batch_deadline = time.monotonic() + BATCH_TIMEOUT
+        
+        yield json.dumps({'type': 'batch', 'count': len(urls), 'playlist': playlist}) + '\n'
+        try:
+            while pending:
+                try:
+                    index, item = results.get(timeout=0.5)
+                except queue.Empty:
+                    now = time.monotonic()
+                    for index in sorted(pending):
+                        began = started.get(index)
+                        if (began and now - began > BATCH_ITEM_TIMEOUT) or now > batch_deadline:
+                            pending.discard(index)
+                            yield json.dumps({
+                                'type': 'item', 'index': index, 'url': urls[index],
+                                'success': False, 'error': 'Timed out'
+                            }) + '\n'
+                    continue
+                if index in pending:
+                    pending.discard(index)
+                    yield json.dumps(dict(item, type='item', index=index, url=urls[index])) + '\n'
+        finally:
+            # Client went away or everything finished: drop entries that never started
+            for future in futures:
+                future.cancel()
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+class DownloadFailed(Exception):
+    """A download that finished without producing the expected file"""
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def run_video_download(url, format_id, temp_dir, progress_hooks=None):
+    """Download a video into temp_dir and return (file_path, download_name, mimetype)"""
+    # Set up yt-dlp options for video download
+    ydl_opts = get_ydl_opts(
+        output_path=os.path.join(temp_dir, '%(title)s.%(ext)s'),
+        format_selector=format_id if format_id != 'best' else 'best[height<=?1080]'
+    )
+    if progress_hooks:
+        ydl_opts['progress_hooks'] = progress_hooks
+    
+    with new_ydl(ydl_opts) as ydl:
+        # Extract once (or reuse the /api/info result) and download from that info
+        info, file_path = download_with_info(ydl, url, segmented=SEGMENTED_DOWNLOADS)
+        if info is None:
+            raise DownloadFailed('Download failed - video information unavailable', 400)
+        title = info.get('title', 'video')
+    
+    # Clean filename
+    safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
+    
+    # Find the downloaded file
+    if not file_path:
+        downloaded_files = []
+        for file in os.listdir(temp_dir):
+            if os.path.isfile(os.path.join(temp_dir, file)):
+                downloaded_files.append(file)
+        
+        if not downloaded_files:
+            raise DownloadFailed('Download failed - no file created')
+        
+        file_path = os.path.join(temp_dir, downloaded_files[0])
+    
+    return file_path, f"{safe_title}.{file_path.split('.')[-1]}", 'video/mp4'
+
+def pipe_audio(ydl, url, info, audio, progress_hooks=None):
+    """Fetch the selected audio source through audio_pipeline; returns (file_path, plan) or None.
+
+    ffmpeg is fed while the source is still downloading, and sources that
+    already satisfy the request are copied or remuxed instead of re-encoded.
+    None means the source needs yt-dlp (manifests, separate streams), the
+    media URL no longer works or ffmpeg could not read the piped source.
+    """
+    fmt = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    if not fmt or fmt.get('requested_formats') or fmt.get('protocol') not in ('http', 'https'):
+        return None
+    plan = plan_audio(fmt, audio)
+    if plan.mode != 'copy' and not audio_pipeline.available:
+        return None
+    
+    from requests import RequestException
+    
+    file_path = f"{os.path.splitext(ydl.prepare_filename(fmt))[0]}.{plan.ext}"
+    try:
+        upstream = get_http_session().get(fmt['url'], headers=format_request_headers(ydl, fmt, url),
+                                          stream=True, timeout=(10, 30))
+        with upstream:
+            if upstream.status_code != 200:
+                logger.info("Audio source returned HTTP %s, handing over to yt-dlp", upstream.status_code)
+                if upstream.status_code in (403, 404, 410):
+                    # Cached media URLs expire; make the fallback re-extract
+                    info_cache.delete(cache_key(url, ALLOWED_EXTRACTORS))
+                return None
+            total_bytes = int(upstream.headers.get('Content-Length') or 0) or None
+            timings = audio_pipeline.run(upstream.iter_content(STREAM_CHUNK_SIZE), file_path, plan,
+                                         audio.bitrate, total_bytes, progress_hooks or ())
+    except (TranscodeFailed, RequestException, OSError) as e:
+        # Dropped connections and read timeouts are routine; yt-dlp retries and resumes them
+        logger.warning("Audio %s of %s failed (%s), handing over to yt-dlp", plan.mode, url, e)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return None
+    
+    logger.info("Audio %s of %s: fetch %.2fs, transcode %.2fs after fetch (%.2fs CPU), queued %.2fs",
+                plan.mode, url, timings['fetch'], timings['transcode'], timings['cpu'], timings['wait'])
+    return file_path, plan
+
+def run_audio_download(url, audio, temp_dir, progress_hooks=None):
+    """Download audio into temp_dir and return (file_path, download_name, mimetype).
+
+    audio is an AudioRequest with the mp3 bitrate and the containers the
+    client accepts.
+    """
+    # Set up yt-dlp options for audio download
+    ydl_opts = get_ydl_opts(
+        output_path=os.path.join(temp_dir, '%(title)s.%(ext)s'),
+        format_selector='bestaudio/best'
+    )
+    if progress_hooks:
+        ydl_opts['progress_hooks'] = progress_hooks
+    
+    with new_ydl(ydl_opts) as ydl:
+        # Extract once (or reuse the /api/info result)
+        info = load_info(ydl, url)
+        if info is None:
+            raise DownloadFailed('Download failed - video information unavailable', 400)
+        title = info.get('title', 'audio')
+        piped = pipe_audio(ydl, url, info, audio, progress_hooks)
+    
+    # Clean filename
+    safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
+    
+    if piped:
+        file_path, plan = piped
+        return file_path, f"{safe_title}.{plan.ext}", plan.mimetype
+    
+    # Let yt-dlp download and convert sources the pipeline can't take
+    ydl_opts['postprocessors'] = [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': audio.bitrate,
+    }]
+    
+    with new_ydl(ydl_opts) as ydl:
+        info, file_path = download_with_info(ydl, url)
+        if info is None:
+            raise DownloadFailed('Download failed - video information unavailable', 400)
+    
+    # Find the downloaded file
+    if not file_path or not file_path.endswith('.mp3'):
+        downloaded_files = []
+        for file in os.listdir(temp_dir):
+            if os.path.isfile(os.path.join(temp_dir, file)) and file.endswith('.mp3'):
+                downloaded_files.append(file)
+        
+        if not downloaded_files:
+            raise DownloadFailed('Audio extraction failed')
+        
+        file_path = os.path.join(temp_dir, downloaded_files[0])
+    
+    return file_path, f"{safe_title}.mp3", 'audio/mpeg'
+
+DOWNLOAD_RUNNERS = {
+    'video': run_video_download,
+    'audio': run_audio_download
+}
+
+def artifact_key(kind, url, option):
+    """Artifact cache key: video identity plus everything that shapes the output file"""
+    if kind == 'audio':
+        return artifact_cache.key(cache_key(url, ALLOWED_EXTRACTORS), kind, option.bitrate, option.accept)
+    return artifact_cache.key(cache_key(url, ALLOWED_EXTRACTORS), kind, option)
+
+def cached_download(kind, url, option, scratch_dir, progress_hooks=None):
+    """Return (file_path, download_name, mimetype), reusing a cached artifact when there is one.
+
+    Concurrent requests for the same artifact share one download. scratch_dir
+    is only created when this request actually has to download.
+    """
+    runner = DOWNLOAD_RUNNERS[kind]
+    
+    def produce():
+        file_path, download_name, mimetype = runner(url, option, scratch_dir.path, progress_hooks)
+        return file_path, {'download_name': download_name, 'mimetype': mimetype}
+    
+    start = time.perf_counter()
+    file_path, meta, cached = artifact_cache.get_or_create(artifact_key(kind, url, option), produce)
+    download_duration.observe(time.perf_counter() - start, kind, 'cache' if cached else 'download')
+    if cached:
+        logger.debug("Serving %s download from the artifact cache: %s", kind, url)
+    return file_path, meta['download_name'], meta['mimetype']
+
+def extractor_name(url):
+    """Extractor key for url's site (hostname when no extractor recognizes it)"""
+    extractor, _, _ = cache_key(url, ALLOWED_EXTRACTORS).partition(':')
+    if extractor == 'url':
+        return (urlparse(url).hostname or 'unknown').lower()
+    return extractor
+
+def check_rate_limit(kind, urls):
+    """Charge this client and the urls' extractors; a 429 response if over budget, else None"""
+    try:
+        rate_limiter.check(kind, request.remote_addr, Counter(extractor_name(url) for url in urls))
+    except RateLimited as e:
+        retry_after = max(1, math.ceil(e.retry_after))
+        logger.info("Rate limited %s request from %s (%s), retry in %ss", kind, request.remote_addr, e.bucket, retry_after)
+        response = jsonify({'error': 'Too many requests, please try again later', 'retry_after': retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    except sqlite3.Error as e:
+        # A stuck limiter database shouldn't take the API down with it
+        logger.warning("Rate limiter unavailable, allowing request: %s", e)
+    return None
+
+def insufficient_storage_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '60'
+    return response, 507
+
+def send_download(kind, url, option):
+    """Run a download (format id or bitrate as option) in a scratch dir and send the result"""
+    scratch_dir = scratch_space.reserve()
+    
+    try:
+        file_path, download_name, mimetype = cached_download(kind, url, option, scratch_dir)
+        # Return file for download (conditional: Range requests and sendfile via wsgi.file_wrapper)
+        response = send_file(
+            file_path,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype=mimetype,
+            conditional=True
+        )
+    except InsufficientStorage as e:
+        scratch_dir.release()
+        return insufficient_storage_response(e)
+    except DownloadFailed as e:
+        scratch_dir.release()
+        return jsonify({'error': str(e)}), e.status
+    except CircuitOpen as e:
+        scratch_dir.release()
+        return circuit_open_response(e)
+    except (yt_dlp.DownloadError, yt_dlp.utils.ExtractorError) as e:
+        scratch_dir.release()
+        return jsonify({'error': f'Download failed: {str(e)}'}), 400
+    except Exception as e:
+        scratch_dir.release()
+        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
+    
+    # send_file has already opened the file. Unlinking it now frees the space as soon as the
+    # server closes that handle, whether the body was fully sent or the client went away.
+    # (call_on_close callbacks never run for send_file's direct-passthrough responses.)
+    scratch_dir.release()
+    return response
 
 @app.route('/api/download/video', methods=['POST'])
 def download_video():
@@ -279,61 +1242,149 @@ def download_video():
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
-        # Create temporary directory for download
-        temp_dir = tempfile.mkdtemp()
+        limited = check_rate_limit('download', [url])
+        if limited:
+            return limited
         
-        # Set up yt-dlp options for video download
-        ydl_opts = get_ydl_opts(
-            output_path=os.path.join(temp_dir, '%(title)s.%(ext)s'),
-            format_selector=format_id if format_id != 'best' else 'best[height<=?1080]'
-        )
+        return send_video_download(url, format_id)
+                
+    except Exception as e:
+        logger.error("Video download error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def send_video_download(url, format_id):
+    """Download a video into a temp dir and send it as an attachment"""
+    return send_download('video', url, format_id)
+
+def resolve_stream_format(url, format_selector, refresh=False):
+    """Select a format and return (info, fmt, headers) for direct proxying.
+
+    fmt is None when the selection is not a single progressive HTTP file
+    (separate video/audio streams, HLS/DASH manifests), which needs yt-dlp
+    to download and merge it instead.
+    """
+    if refresh:
+        info_cache.delete(cache_key(url, ALLOWED_EXTRACTORS))
+    
+    # The selector comes from the client, so it is applied per call rather than
+    # becoming part of the pool key (see ydl_pool.format_selection)
+    with ydl_pool.checkout(get_info_ydl_opts()) as ydl:
+        info = load_info(ydl, url)
+        if info is None:
+            return None, None, None
+        
+        with format_selection(ydl, format_selector):
+            fmt = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        headers = format_request_headers(ydl, fmt, url)
+    
+    return info, fmt if is_progressive(fmt) else None, headers
+
+def open_upstream_stream(fmt, headers):
+    """Open the direct media URL, forwarding the client's Range header"""
+    headers = dict(headers)
+    if request.headers.get('Range'):
+        headers['Range'] = request.headers['Range']
+    if request.headers.get('If-Range'):
+        headers['If-Range'] = request.headers['If-Range']
+    return get_http_session().get(fmt['url'], headers=headers, stream=True, timeout=(10, 30))
+
+@app.route('/api/download/stream', methods=['GET', 'POST'])
+def stream_video():
+    """Stream a progressive video to the client while it is being fetched.
+
+    Accepts the same parameters as /api/download/video (as query or form
+    fields). GET requests honour Range so browsers and download managers
+    can resume. Formats that need merging fall back to a regular download.
+    """
+    try:
+        params = request.values
+        url = params.get('url', '').strip()
+        format_id = params.get('format_id', 'best')
+        
+        if not url:
+            return jsonify({'error': 'URL is required'}), 400
+        
+        # Every request is charged: a Range header alone proves no earlier charged response
+        limited = check_rate_limit('download', [url])
+        if limited:
+            return limited
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # A finished download of the same format is cheaper than proxying upstream
+        cached = artifact_cache.get(artifact_key('video', url, format_id))
+        if cached is not None:
+            file_path, meta = cached
+            return send_file(file_path, as_attachment=True, download_name=meta['download_name'],
+                             mimetype=meta['mimetype'], conditional=True)
+        
+        format_selector = format_id if format_id != 'best' else 'best[height<=?1080]'
+        info, fmt, headers = resolve_stream_format(url, format_selector)
+        if info is None:
+            return jsonify({'error': 'Download failed - video information unavailable'}), 400
+        if fmt is None:
+            logger.debug("Format %s is not progressive, falling back to full download", format_id)
+            return send_video_download(url, format_id)
+        
+        from requests import RequestException
+        try:
+            upstream = open_upstream_stream(fmt, headers)
+            if upstream.status_code in (403, 404, 410):
+                # Cached media URLs expire; re-extract once before giving up
+                upstream.close()
+                info, fmt, headers = resolve_stream_format(url, format_selector, refresh=True)
+                if fmt is None:
+                    return send_video_download(url, format_id)
+                upstream = open_upstream_stream(fmt, headers)
+        except RequestException as e:
+            logger.warning("Could not open upstream media for %s: %s", url, e)
+            return jsonify({'error': 'Could not reach the upstream media server'}), 502
+
+        if upstream.status_code not in (200, 206, 416):
+            upstream.close()
+            return jsonify({'error': f'Upstream returned HTTP {upstream.status_code}'}), 502
+        
+        title = info.get('title', 'video')
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
+        filename = f"{safe_title}.{fmt.get('ext', 'mp4')}"
+        ascii_filename = filename.encode('ascii', 'replace').decode().replace('?', '_')
+        
+        response_headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': f"attachment; filename=\"{ascii_filename}\"; filename*=UTF-8''{quote(filename)}"
+        }
+        for name in ('Content-Length', 'Content-Range', 'ETag', 'Last-Modified'):
+            if upstream.headers.get(name):
+                response_headers[name] = upstream.headers[name]
+        
+        def generate():
+            sent = 0
             try:
-                # Extract info first to get filename
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'video')
-                
-                # Clean filename
-                safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
-                
-                # Download the video
-                ydl.download([url])
-                
-                # Find the downloaded file
-                downloaded_files = []
-                for file in os.listdir(temp_dir):
-                    if os.path.isfile(os.path.join(temp_dir, file)):
-                        downloaded_files.append(file)
-                
-                if not downloaded_files:
-                    return jsonify({'error': 'Download failed - no file created'}), 500
-                
-                file_path = os.path.join(temp_dir, downloaded_files[0])
-                
-                # Return file for download
-                def remove_file(response):
-                    try:
-                        os.remove(file_path)
-                        os.rmdir(temp_dir)
-                    except:
-                        pass
-                    return response
-                
-                return send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=f"{safe_title}.{downloaded_files[0].split('.')[-1]}",
-                    mimetype='video/mp4'
-                )
-                
-            except yt_dlp.DownloadError as e:
-                return jsonify({'error': f'Download failed: {str(e)}'}), 400
-            except Exception as e:
-                return jsonify({'error': f'Processing failed: {str(e)}'}), 500
-                
+                for chunk in upstream.iter_content(STREAM_CHUNK_SIZE):
+                    if chunk:
+                        sent += len(chunk)
+                        yield chunk
+            finally:
+                upstream.close()
+                if 'Content-Length' not in response_headers:
+                    # Otherwise counted from the header in record_request_metrics
+                    bytes_served.inc('stream_video', amount=sent)
+        
+        return Response(
+            generate(),
+            status=upstream.status_code,
+            mimetype=upstream.headers.get('Content-Type') or 'video/mp4',
+            headers=response_headers,
+            direct_passthrough=True
+        )
+        
+    except CircuitOpen as e:
+        return circuit_open_response(e)
+    except (yt_dlp.DownloadError, yt_dlp.utils.ExtractorError) as e:
+        # process_ie_result raises ExtractorError itself, e.g. "Requested format is not available"
+        return jsonify({'error': f'Download failed: {str(e)}'}), 400
+    except SyntaxError as e:
+        return jsonify({'error': f'Invalid format selector: {e}'}), 400
     except Exception as e:
-        logger.error(f"Video download error: {str(e)}")
+        logger.error("Video stream error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/download/audio', methods=['POST'])
@@ -341,93 +1392,326 @@ def download_audio():
     """Download audio file"""
     try:
         url = request.form.get('url', '').strip()
-        bitrate = request.form.get('bitrate', '192')
+        bitrate = parse_audio_bitrate(request.form.get('bitrate', '192'))
         
         if not url:
             return jsonify({'error': 'URL is required'}), 400
+        if bitrate is None:
+            return jsonify({'error': 'bitrate must be a number of kbps between 32 and 320'}), 400
         
-        # Create temporary directory for download
-        temp_dir = tempfile.mkdtemp()
+        limited = check_rate_limit('download', [url])
+        if limited:
+            return limited
         
-        # Set up yt-dlp options for audio download
-        ydl_opts = get_ydl_opts(
-            output_path=os.path.join(temp_dir, '%(title)s.%(ext)s')
-        )
+        audio = AudioRequest(bitrate, parse_audio_accept(request.form.get('accept')))
+        return send_download('audio', url, audio)
+                
+    except Exception as e:
+        logger.error("Audio download error: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+def run_job(job):
+    """Job runner: download into the job's own scratch dir with progress reporting"""
+    job.scratch = scratch_space.reserve()
+    hooks = [ProgressHook(job.id)]
+    params = job.params
+    if job.kind == 'audio':
+        option = AudioRequest(params.get('bitrate', '192'), tuple(params.get('accept', ('mp3',))))
+    else:
+        option = params.get('format_id', 'best')
+    return cached_download(job.kind, params['url'], option, job.scratch, hooks)
+
+# Background download jobs (see jobs.py for settings)
+job_manager = create_job_manager(run_job)
+
+def job_status(job):
+    """Job state merged with the latest progress reported by its ProgressHook"""
+    data = job.to_dict()
+    if job.status == 'queued':
+        data['queue_position'] = job_manager.queue_position(job)
+    progress = progress_store.get(job.id)
+    if progress:
+        # Never expose server-side paths
+        data['progress'] = {k: v for k, v in progress.items() if k != 'filename'}
+    return data
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a video or audio download and return its job id"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        url = (data.get('url') or '').strip()
+        kind = data.get('type', 'video')
         
-        # Configure for audio extraction
-        ydl_opts.update({
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': bitrate,
-            }],
-        })
+        if not url:
+            return jsonify({'error': 'URL is required'}), 400
+        if not re.match(r'^https?://', url):
+            return jsonify({'error': 'Invalid URL format'}), 400
+        if kind not in ('video', 'audio'):
+            return jsonify({'error': 'type must be video or audio'}), 400
+        
+        params = {'url': url}
+        if kind == 'audio':
+            params['bitrate'] = parse_audio_bitrate(data.get('bitrate', '192'))
+            if params['bitrate'] is None:
+                return jsonify({'error': 'bitrate must be a number of kbps between 32 and 320'}), 400
+            params['accept'] = parse_audio_accept(data.get('accept'))
+        else:
+            params['format_id'] = data.get('format_id', 'best')
+        
+        try:
+            scratch_space.check()
+        except InsufficientStorage as e:
+            return insufficient_storage_response(e)
+        
+        limited = check_rate_limit('download', [url])
+        if limited:
+            return limited
+        
+        try:
+            job = job_manager.submit(kind, params, client=request.remote_addr)
+        except JobQueueFull as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '10'
+            return response, 429
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}',
+            'events_url': f'/api/jobs/{job.id}/events',
+            'file_url': f'/api/jobs/{job.id}/file'
+        }), 202
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                # Extract info first to get filename
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'audio')
-                
-                # Clean filename
-                safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)[:100]
-                
-                # Download and convert to audio
-                ydl.download([url])
-                
-                # Find the downloaded file
-                downloaded_files = []
-                for file in os.listdir(temp_dir):
-                    if os.path.isfile(os.path.join(temp_dir, file)) and file.endswith('.mp3'):
-                        downloaded_files.append(file)
-                
-                if not downloaded_files:
-                    return jsonify({'error': 'Audio extraction failed'}), 500
-                
-                file_path = os.path.join(temp_dir, downloaded_files[0])
-                
-                # Return file for download
-                return send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=f"{safe_title}.mp3",
-                    mimetype='audio/mpeg'
-                )
-                
-            except yt_dlp.DownloadError as e:
-                return jsonify({'error': f'Download failed: {str(e)}'}), 400
-            except Exception as e:
-                return jsonify({'error': f'Processing failed: {str(e)}'}), 500
-                
     except Exception as e:
-        logger.error(f"Audio download error: {str(e)}")
+        logger.error("Job creation error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Current status and progress of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        # The job may belong to another worker; the shared store still has its progress
+        progress = progress_store.get(job_id)
+        if progress is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({
+            'id': job_id,
+            'status': progress.get('status', 'running'),
+            'progress': {k: v for k, v in progress.items() if k != 'filename'}
+        })
+    return jsonify(job_status(job))
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of job status until it finishes"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        last = None
+        last_sent = 0
+        while True:
+            status = job_status(job)
+            payload = json.dumps(status)
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+                last_sent = time.time()
+            elif time.time() - last_sent > 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            if status['status'] in ('finished', 'error'):
+                yield f"event: done\ndata: {payload}\n\n"
+                return
+            time.sleep(JOB_EVENT_INTERVAL)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/file')
+def job_file(job_id):
+    """Fetch the finished artifact of a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == 'error':
+        return jsonify({'error': job.error}), 400
+    if job.status != 'finished':
+        return jsonify({'error': 'Job is not finished yet', 'status': job.status}), 409
+    
+    file_path, download_name, mimetype = job.result
+    if not os.path.isfile(file_path):
+        # Evicted from the artifact cache since the job finished
+        return jsonify({'error': 'Job file is no longer available'}), 410
+    return send_file(file_path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+def send_cached_thumbnail(meta, body_path):
+    """Serve a cached thumbnail, answering If-None-Match/If-Modified-Since with 304"""
+    return send_file(
+        body_path,
+        mimetype=meta.get('content_type', 'image/jpeg'),
+        etag=meta['etag'],
+        last_modified=meta.get('fetched'),
+        max_age=THUMBNAIL_MAX_AGE,
+        conditional=True
+    )
+
+def open_thumbnail_upstream(thumbnail_url, cached):
+    """Request a thumbnail, revalidating a stale cached copy if we have one"""
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    if cached:
+        if cached[0].get('upstream_etag'):
+            headers['If-None-Match'] = cached[0]['upstream_etag']
+        if cached[0].get('upstream_last_modified'):
+            headers['If-Modified-Since'] = cached[0]['upstream_last_modified']
+    response = get_http_session().get(thumbnail_url, timeout=10, headers=headers, stream=True)
+    meta = {
+        'content_type': response.headers.get('content-type', 'image/jpeg'),
+        'upstream_etag': response.headers.get('ETag'),
+        'upstream_last_modified': response.headers.get('Last-Modified')
+    }
+    return response, meta
+
+def fetch_thumbnail_source(thumbnail_url):
+    """Make sure the original thumbnail is in the cache and return (meta, body_path)"""
+    cached = thumbnail_cache.get(thumbnail_url)
+    if cached and thumbnail_cache.is_fresh(cached[0]):
+        return cached
+    
+    response, meta = open_thumbnail_upstream(thumbnail_url, cached)
+    try:
+        if response.status_code == 304 and cached:
+            return thumbnail_cache.refresh(thumbnail_url, cached[0]), cached[1]
+        if response.status_code != 200:
+            return cached
+        
+        writer = thumbnail_cache.writer(thumbnail_url)
+        for chunk in response.iter_content(THUMBNAIL_CHUNK_SIZE):
+            if writer.size + len(chunk) > THUMBNAIL_MAX_BYTES:
+                writer.abort()
+                return None
+            writer.write(chunk)
+        writer.commit(meta)
+    finally:
+        response.close()
+    return thumbnail_cache.get(thumbnail_url)
+
+def send_derived_thumbnail(thumbnail_url, width, height, requested_format):
+    """Serve a resized/re-encoded thumbnail from the derived image cache"""
+    fmt = negotiate_format(requested_format, request.headers.get('Accept'))
+    if fmt is None:
+        return jsonify({'error': f'Unsupported image format: {requested_format}'}), 400
+    
+    source = fetch_thumbnail_source(thumbnail_url)
+    if source is None:
+        return jsonify({'error': 'Failed to fetch thumbnail'}), 404
+    
+    # Keyed by the source content hash, so a derived image never goes stale
+    derived_key = f"{source[0]['etag']}:{width or 0}x{height or 0}:{fmt}"
+    derived = derived_cache.get(derived_key)
+    if derived is None:
+        try:
+            body = resize_image(source[1], width, height, fmt)
+        except Exception as e:
+            # Formats Pillow can't read (SVG, ...) are passed through untouched
+            logger.warning("Thumbnail resize failed, serving original: %s", e)
+            return send_cached_thumbnail(*source)
+        derived = derived_cache.put(derived_key, body, {'content_type': IMAGE_FORMATS[fmt][1]})
+    
+    response = send_file(
+        derived[1],
+        mimetype=derived[0]['content_type'],
+        etag=derived[0]['etag'],
+        conditional=True
+    )
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if not requested_format or requested_format == 'auto':
+        response.headers['Vary'] = 'Accept'
+    return response
+
 @app.route('/api/thumbnail/proxy')
 def proxy_thumbnail():
-    """Proxy thumbnail images to avoid CORS issues"""
+    """Proxy thumbnail images to avoid CORS issues.
+
+    Optional w/h resize the image to fit and format (webp, avif, jpeg, png
+    or auto) re-encodes it; auto picks the best format the Accept header allows.
+    """
     try:
         thumbnail_url = request.args.get('url')
         if not thumbnail_url:
             return jsonify({'error': 'URL parameter required'}), 400
+        if not re.match(r'^https?://', thumbnail_url):
+            return jsonify({'error': 'Invalid URL format'}), 400
         
-        # Fetch the thumbnail
-        response = requests.get(thumbnail_url, timeout=10, headers={
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        width = clamp_dimension(request.args.get('w'))
+        height = clamp_dimension(request.args.get('h'))
+        requested_format = (request.args.get('format') or '').lower()
+        if (width or height or requested_format) and can_resize():
+            return send_derived_thumbnail(thumbnail_url, width, height, requested_format)
         
-        if response.status_code == 200:
-            return Response(
-                response.content,
-                mimetype=response.headers.get('content-type', 'image/jpeg'),
-                headers={'Cache-Control': 'public, max-age=3600'}
-            )
-        else:
+        cached = thumbnail_cache.get(thumbnail_url)
+        if cached and thumbnail_cache.is_fresh(cached[0]):
+            return send_cached_thumbnail(*cached)
+        
+        response, meta = open_thumbnail_upstream(thumbnail_url, cached)
+        
+        if response.status_code == 304 and cached:
+            response.close()
+            return send_cached_thumbnail(thumbnail_cache.refresh(thumbnail_url, cached[0]), cached[1])
+        
+        if response.status_code != 200:
+            response.close()
+            if cached:
+                # Serve the stale copy rather than failing
+                return send_cached_thumbnail(*cached)
             return jsonify({'error': 'Failed to fetch thumbnail'}), 404
+        
+        content_length = int(response.headers.get('Content-Length') or 0)
+        if content_length > THUMBNAIL_MAX_BYTES:
+            response.close()
+            return jsonify({'error': 'Thumbnail too large'}), 502
+        
+        writer = thumbnail_cache.writer(thumbnail_url)
+        
+        def generate():
+            # Stream to the client and into the cache at the same time
+            complete = False
+            try:
+                for chunk in response.iter_content(THUMBNAIL_CHUNK_SIZE):
+                    if writer.size + len(chunk) > THUMBNAIL_MAX_BYTES:
+                        logger.warning("Thumbnail exceeded %s bytes, truncating: %s", THUMBNAIL_MAX_BYTES, thumbnail_url)
+                        return
+                    writer.write(chunk)
+                    yield chunk
+                complete = True
+            finally:
+                response.close()
+                if complete:
+                    writer.commit(meta)
+                else:
+                    writer.abort()
+        
+        response_headers = {'Cache-Control': f'public, max-age={THUMBNAIL_MAX_AGE}'}
+        if content_length:
+            response_headers['Content-Length'] = str(content_length)
+        if meta['upstream_last_modified']:
+            response_headers['Last-Modified'] = meta['upstream_last_modified']
+        
+        return Response(
+            generate(),
+            mimetype=meta['content_type'],
+            headers=response_headers,
+            direct_passthrough=True
+        )
             
     except Exception as e:
-        logger.error(f"Thumbnail proxy error: {str(e)}")
+        logger.error("Thumbnail proxy error: %s", e)
         return jsonify({'error': 'Failed to proxy thumbnail'}), 500
 
 @app.route('/api/thumbnail/placeholder')
@@ -447,6 +1731,102 @@ def placeholder_thumbnail():
     
     return Response(svg_content, mimetype='image/svg+xml')
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Hit/miss counters of the caches and pools for tuning"""
+    return jsonify({
+        'info': info_cache.stats(),
+        'ydl_pool': ydl_pool.stats(),
+        'cookies': cookie_store.stats(),
+        'thumbnails': thumbnail_cache.stats(),
+        'derived_thumbnails': derived_cache.stats(),
+        'artifacts': artifact_cache.stats(),
+        'scratch': scratch_space.stats(),
+        'segment_throughput': segment_tuner.stats(),
+        'audio_pipeline': audio_pipeline.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'negative_cache': negative_cache.stats(),
+        'circuit_breakers': circuit_breakers.stats(),
+        'jobs': job_manager.stats()
+    })
+
+@metrics.collector('mdl_cache_lookups_total', 'counter', 'Cache lookups by result', ('cache', 'result'))
+def collect_cache_lookups():
+    samples = {}
+    for name, stats in (
+        ('info', info_cache.stats()),
+        ('artifacts', artifact_cache.stats()),
+        ('thumbnails', thumbnail_cache.stats()),
+        ('derived_thumbnails', derived_cache.stats())
+    ):
+        for result in ('hits', 'misses', 'coalesced', 'revalidated'):
+            if result in stats:
+                samples[(name, result)] = stats[result]
+    pool = ydl_pool.stats()
+    samples[('ydl_pool', 'hits')] = pool['reused']
+    samples[('ydl_pool', 'misses')] = pool['created']
+    return samples
+
+@metrics.collector('mdl_artifact_bytes_saved_total', 'counter', 'Download bytes served from the artifact cache')
+def collect_bytes_saved():
+    return {(): artifact_cache.stats()['bytes_saved']}
+
+@metrics.collector('mdl_cache_bytes', 'gauge', 'Bytes held by each disk cache', ('cache',))
+def collect_cache_bytes():
+    return {
+        ('artifacts',): artifact_cache.stats()['bytes'],
+        ('thumbnails',): thumbnail_cache.stats()['bytes'],
+        ('derived_thumbnails',): derived_cache.stats()['bytes']
+    }
+
+@metrics.collector('mdl_jobs', 'gauge', 'Background jobs by state', ('state',))
+def collect_jobs():
+    stats = job_manager.stats()
+    return {('queued',): stats['queued'], ('active',): stats['active']}
+
+@metrics.collector('mdl_scratch_bytes_in_flight', 'gauge', 'Bytes in download scratch directories')
+def collect_scratch():
+    return {(): scratch_space.stats()['bytes_in_flight']}
+
+@metrics.collector('mdl_rate_limited_total', 'counter', 'Requests refused with 429 by bucket scope', ('kind', 'scope'))
+def collect_rate_limited():
+    return rate_limiter.limited.copy()
+
+@metrics.collector('mdl_circuits_open', 'gauge', 'Extractor circuit breakers not closed')
+def collect_circuits():
+    return {(): circuit_breakers.open_count()}
+
+@metrics.collector('mdl_transcodes_active', 'gauge', 'ffmpeg processes running for audio downloads')
+def collect_transcodes():
+    return {(): audio_pipeline.stats()['busy']}
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiler:
+        profiler.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(time.perf_counter() - g.request_started, endpoint, request.method,
+                            str(response.status_code))
+    if response.content_length and request.method != 'HEAD' and response.status_code != 304:
+        bytes_served.inc(endpoint, amount=response.content_length)
+    return response
+
+@app.teardown_request
+def finish_request_profile(error):
+    if profiler and 'request_started' in g:
+        path = profiler.end(f'{request.method} {request.path}', time.perf_counter() - g.request_started)
+        if path:
+            logger.info("Slow request profile written to %s", path)
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
@@ -470,6 +1850,11 @@ def serve_frontend_files(filename):
     except:
         return send_file('index.html')
 
+# Pre-build extraction instances so the first /api/info request doesn't pay for it.
+# Skipped on Vercel, where it would only lengthen cold starts.
+if os.environ.get('VERCEL') != '1':
+    ydl_pool.warm(get_info_ydl_opts(), int(os.environ.get('YDL_POOL_WARM', 1)))
+
 # Export the app for Vercel
 application = app
 
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class _Flight:
+    """A single in-progress download that concurrent requests for the same artifact wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ArtifactCache:
+    """Byte-bounded LRU disk cache of finished downloads.
+
+    Entries are keyed by everything that determines the output file (video
+    identity, format selector, postprocessor settings), so repeat downloads
+    of a popular video are served from disk instead of being fetched and
+    transcoded again. Each entry is a ``<key>.bin`` file plus a
+    ``<key>.json`` holding the download name and MIME type; the .json's
+    mtime records the last access.
+
+    Workers may share the directory: an entry another worker wrote is
+    adopted on first lookup, and each add re-reads the directory before
+    evicting, so max_bytes bounds the directory as a whole.
+    """
+
+    # Temp files older than this were left by a crashed add and are removed at startup
+    STALE_TMP_AGE = 3600
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bytes_saved = 0
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """Return (file_path, meta) for a cached artifact, or None"""
+        with self._lock:
+            known = key in self._index
+            if known:
+                self._index.move_to_end(key)
+        if not known and not self._adopt(key):
+            return None
+        meta = self._read_meta(key)
+        path = self._body_path(key)
+        if meta is None or not os.path.isfile(path):
+            self._forget(key)
+            return None
+        try:
+            # Recency lives on the sidecar: the body's mtime feeds send_file's
+            # ETag/Last-Modified, which must stay put for If-Range resumes
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += meta['size']
+        return path, meta
+
+    def add(self, key, file_path, meta):
+        """Move a finished download into the cache; returns (path, meta) or None if it doesn't fit"""
+        size = os.path.getsize(file_path)
+        if not self.enabled or size > self.max_bytes:
+            return None
+        tmp_path = os.path.join(self.directory, f'.{key}.{uuid.uuid4().hex}.tmp')
+        shutil.move(file_path, tmp_path)  # a rename when the temp dir is on the same filesystem
+        os.replace(tmp_path, self._body_path(key))
+        meta = dict(meta, size=size, created=time.time())
+        meta_tmp = f'{self._meta_path(key)}.{uuid.uuid4().hex}.tmp'
+        with open(meta_tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, self._meta_path(key))
+        entries = self._scan()  # Picks up what other workers added or evicted
+        with self._lock:
+            self._index = OrderedDict((k, k_size) for k, k_size in entries if k != key)
+            self._index[key] = size
+            self._bytes = sum(self._index.values())
+            evicted = []
+            while self._bytes > self.max_bytes and self._index:
+                old_key, old_size = self._index.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove_files(old_key)
+        return self._body_path(key), meta
+
+    def get_or_create(self, key, producer):
+        """Return (file_path, meta, cached), running producer at most once per key at a time.
+
+        producer() downloads the artifact and returns (file_path, meta). Its
+        file is moved into the cache; concurrent requests for the same key
+        wait for it instead of starting their own download. If the result
+        could not be cached, each waiter runs producer itself.
+        """
+        if not self.enabled:
+            file_path, meta = producer()
+            return file_path, meta, False
+
+        cached = self.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.value is not None:
+                with self._lock:
+                    self.bytes_saved += flight.value[1]['size']
+                return flight.value[0], flight.value[1], True
+            file_path, meta = producer()
+            return file_path, meta, False
+
+        try:
+            file_path, meta = producer()
+            flight.value = self.add(key, file_path, meta)
+            if flight.value is None:
+                return file_path, meta, False
+            return flight.value[0], flight.value[1], False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._index),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved
+            }
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _forget(self, key):
+        with self._lock:
+            size = self._index.pop(key, None)
+            if size is not None:
+                self._bytes -= size
+        self._remove_files(key)
+
+    def _remove_files(self, key):
+        for path in (self._body_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _adopt(self, key):
+        """Index an entry that another worker (or a previous run) wrote; False if there is none"""
+        try:
+            size = os.path.getsize(self._body_path(key))
+        except OSError:
+            return False
+        if not os.path.exists(self._meta_path(key)):
+            return False  # Body without meta: still being written, or half removed
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = size
+                self._bytes += size
+        return True
+
+    def _load_index(self):
+        """Rebuild the LRU order from files left by a previous run, removing stray temp files"""
+        cutoff = time.time() - self.STALE_TMP_AGE
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                path = os.path.join(self.directory, name)
+                try:
+                    # Recent ones may be another worker's add in progress
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+        for key, size in self._scan():
+            self._index[key] = size
+            self._bytes += size
+
+    def _scan(self):
+        """[(key, size)] for the entries on disk, least recently accessed first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                key = name[:-4]
+                try:
+                    size = os.path.getsize(os.path.join(self.directory, name))
+                    accessed = os.path.getmtime(self._meta_path(key))
+                except OSError:
+                    continue
+                entries.append((accessed, key, size))
+        return [(key, size) for _, key, size in sorted(entries)]
+
+
+def create_artifact_cache():
+    """Build the download artifact cache from environment configuration (ARTIFACT_CACHE_BYTES=0 disables it)"""
+    return ArtifactCache(
+        os.environ.get('ARTIFACT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mdownloader-artifacts'),
+        max_bytes=int(os.environ.get('ARTIFACT_CACHE_BYTES', 1024 * 1024 * 1024))
+    )
@@ -0,0 +1,243 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+# Output containers a client may accept besides mp3: extension -> (source codec prefix, MIME type)
+AUDIO_OUTPUTS = {
+    'mp3': ('mp3', 'audio/mpeg'),
+    'm4a': ('mp4a', 'audio/mp4'),
+    'opus': ('opus', 'audio/ogg')
+}
+
+# A source up to this much above the requested bitrate is kept as is
+BITRATE_TOLERANCE = 1.25
+
+AudioRequest = namedtuple('AudioRequest', 'bitrate accept')
+AudioPlan = namedtuple('AudioPlan', 'mode ext mimetype')
+
+
+# mp3 bitrates (kbps) a client may ask for
+MIN_BITRATE = 32
+MAX_BITRATE = 320
+
+
+def parse_audio_bitrate(value):
+    """Normalized bitrate string ('192') for a client value, or None if it isn't a usable mp3 bitrate"""
+    try:
+        bitrate = int(str(value).strip().lower().removesuffix('k'))
+    except (TypeError, ValueError):
+        return None
+    if not MIN_BITRATE <= bitrate <= MAX_BITRATE:
+        return None
+    return str(bitrate)
+
+
+def parse_audio_accept(value):
+    """Containers the client accepts, from a comma separated list; mp3 is always allowed"""
+    accept = {'mp3'}
+    for name in (value or '').lower().replace(' ', '').split(','):
+        if name in AUDIO_OUTPUTS:
+            accept.add(name)
+    return tuple(sorted(accept))
+
+
+def plan_audio(fmt, request):
+    """Decide how to turn the selected source format into the requested audio file.
+
+    'copy' writes an mp3 source through untouched, 'remux' moves an
+    m4a/opus stream into a standalone container without re-encoding and
+    'transcode' encodes mp3 at the requested bitrate.
+    """
+    acodec = (fmt.get('acodec') or '').lower()
+    abr = fmt.get('abr') or fmt.get('tbr')
+    small_enough = not abr or abr <= int(request.bitrate) * BITRATE_TOLERANCE
+    if small_enough and fmt.get('vcodec') in ('none', None):
+        if acodec.startswith('mp3') and fmt.get('ext') == 'mp3':
+            return AudioPlan('copy', 'mp3', AUDIO_OUTPUTS['mp3'][1])
+        for ext in request.accept:
+            prefix, mimetype = AUDIO_OUTPUTS[ext]
+            if ext != 'mp3' and acodec.startswith(prefix):
+                return AudioPlan('remux', ext, mimetype)
+    return AudioPlan('transcode', 'mp3', AUDIO_OUTPUTS['mp3'][1])
+
+
+class TranscodeFailed(Exception):
+    """ffmpeg could not produce the output file"""
+
+
+class AudioPipeline:
+    """Runs ffmpeg on a download while it is still being fetched.
+
+    Source chunks are written to ffmpeg's stdin as they arrive (and spooled
+    to disk, so a container that can't be demuxed from a pipe is retried
+    from the file). Re-encodes hold one of ``workers`` slots, sized to the
+    CPU count by default; stream copies and remuxes are cheap and don't.
+    """
+
+    def __init__(self, workers=None, ffmpeg=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.totals = {}  # mode -> summed timings
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def run(self, chunks, dest_path, plan, bitrate, total_bytes=None, progress_hooks=()):
+        """Feed chunks into dest_path according to plan and return the stage timings"""
+        timings = {'wait': 0.0, 'fetch': 0.0, 'transcode': 0.0, 'cpu': 0.0}
+        if plan.mode == 'copy':
+            start = time.monotonic()
+            with open(dest_path, 'wb') as f:
+                self._feed(chunks, [f], dest_path, total_bytes, progress_hooks)
+            timings['fetch'] = time.monotonic() - start
+            self._record(plan.mode, timings)
+            return timings
+
+        if plan.mode == 'transcode':
+            start = time.monotonic()
+            self._slots.acquire()
+            timings['wait'] = time.monotonic() - start
+        with self._lock:
+            self.busy += 1
+        try:
+            self._run_ffmpeg(chunks, dest_path, plan, bitrate, total_bytes, progress_hooks, timings)
+        finally:
+            with self._lock:
+                self.busy -= 1
+            if plan.mode == 'transcode':
+                self._slots.release()
+        self._record(plan.mode, timings)
+        return timings
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': self.available,
+                'workers': self.workers,
+                'busy': self.busy,
+                'modes': {mode: {k: round(v, 3) for k, v in totals.items()} for mode, totals in self.totals.items()}
+            }
+
+    def _command(self, source, dest_path, plan, bitrate):
+        # -xerror: without it ffmpeg exits 0 after failing to demux a partial input
+        command = [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-xerror', '-y']
+        if source != 'pipe:0':
+            command.append('-nostdin')
+        command += ['-i', source, '-vn']
+        if plan.mode == 'transcode':
+            command += ['-c:a', 'libmp3lame', '-b:a', f'{int(bitrate)}k']
+        else:
+            command += ['-c:a', 'copy']
+        return command + [dest_path]
+
+    def _run_ffmpeg(self, chunks, dest_path, plan, bitrate, total_bytes, progress_hooks, timings):
+        spool_path = f'{dest_path}.source'
+        start = time.monotonic()
+        with tempfile.TemporaryFile() as stderr, open(spool_path, 'wb') as spool:
+            proc = subprocess.Popen(self._command('pipe:0', dest_path, plan, bitrate),
+                                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                self._feed(chunks, [spool, _PipeWriter(proc.stdin)], dest_path, total_bytes, progress_hooks)
+            except BaseException:
+                # The source broke off: stop ffmpeg before it finishes a truncated file
+                proc.kill()
+                _wait(proc)
+                _remove(spool_path, dest_path)
+                raise
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+            timings['fetch'] = time.monotonic() - start
+            returncode, cpu = _wait(proc)
+            timings['transcode'] = time.monotonic() - start - timings['fetch']
+            timings['cpu'] = cpu
+            if returncode != 0:
+                # e.g. an mp4 with its index at the end can't be read from a pipe; the spool can
+                spool.close()
+                retry_start = time.monotonic()
+                stderr.seek(0)
+                stderr.truncate()
+                proc = subprocess.Popen(self._command(spool_path, dest_path, plan, bitrate),
+                                        stdout=subprocess.DEVNULL, stderr=stderr)
+                returncode, cpu = _wait(proc)
+                timings['transcode'] += time.monotonic() - retry_start
+                timings['cpu'] += cpu
+            if returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode(errors='replace').strip().splitlines()
+        # A failed run leaves no partial output behind for the caller's fallback to trip over
+        _remove(*((spool_path,) if returncode == 0 else (spool_path, dest_path)))
+        if returncode != 0:
+            raise TranscodeFailed(message[-1] if message else f'ffmpeg exited with status {returncode}')
+
+    @staticmethod
+    def _feed(chunks, outputs, dest_path, total_bytes, progress_hooks):
+        downloaded = 0
+        start = time.monotonic()
+        for chunk in chunks:
+            for output in outputs:
+                output.write(chunk)
+            downloaded += len(chunk)
+            elapsed = time.monotonic() - start
+            for hook in progress_hooks:
+                hook({
+                    'status': 'downloading', 'filename': dest_path, 'downloaded_bytes': downloaded,
+                    'total_bytes': total_bytes, 'elapsed': elapsed,
+                    'speed': downloaded / elapsed if elapsed > 0 else None, 'eta': None
+                })
+        for hook in progress_hooks:
+            hook({'status': 'finished', 'filename': dest_path, 'downloaded_bytes': downloaded,
+                  'total_bytes': downloaded, 'elapsed': time.monotonic() - start})
+
+    def _record(self, mode, timings):
+        with self._lock:
+            totals = self.totals.setdefault(mode, {'count': 0, 'wait': 0.0, 'fetch': 0.0, 'transcode': 0.0, 'cpu': 0.0})
+            totals['count'] += 1
+            for key, value in timings.items():
+                totals[key] += value
+
+
+class _PipeWriter:
+    """ffmpeg may stop reading early (e.g. on a bad input); keep spooling the source regardless"""
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.broken = False
+
+    def write(self, chunk):
+        if not self.broken:
+            try:
+                self.pipe.write(chunk)
+            except (BrokenPipeError, OSError):
+                self.broken = True
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _wait(proc):
+    """Wait for a child and return (exit code, CPU seconds it used)"""
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_utime + usage.ru_stime
+
+
+def create_audio_pipeline():
+    """Build the transcode pipeline from environment configuration (TRANSCODE_WORKERS defaults to the CPU count)"""
+    workers = os.environ.get('TRANSCODE_WORKERS')
+    return AudioPipeline(workers=int(workers) if workers else None, ffmpeg=os.environ.get('FFMPEG_PATH'))
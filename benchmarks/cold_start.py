@@ -0,0 +1,117 @@
+"""Cold-start cost of the app: import time and first-request latency per route.
+
+Every sample is a fresh interpreter with VERCEL=1 (the serverless
+configuration) and an empty TMPDIR that imports app and serves one
+request through Flask's test client, as a cold serverless invocation
+does. Also lists which heavy modules each route pulled in. Extraction
+routes use the offline stub extractor and a local media server.
+
+--budget-ms fails the run (exit 1) if the median import + first /health
+request exceeds it, and --info-budget-ms does the same for the first
+/api/info extraction, so cold-start regressions show up in CI.
+
+Usage (from the repository root):
+    python benchmarks/cold_start.py [--runs 5] [--budget-ms 400] [--info-budget-ms 1000]
+                                    [--env ALLOWED_EXTRACTORS=stub]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from media_server import MediaServer
+
+HEAVY_MODULES = ('yt_dlp', 'requests', 'PIL.Image')
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+method, path, body = json.loads(sys.argv[1])
+client = app.app.test_client()
+response = client.open(path, method=method, json=body)
+done = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import_ms': (imported - start) * 1000,
+    'request_ms': (done - imported) * 1000,
+    'modules': [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+}))
+"""
+
+
+def routes(media_base):
+    return {
+        '/health': ('GET', '/health', None),
+        '/api/thumbnail/placeholder': ('GET', '/api/thumbnail/placeholder?platform=youtube', None),
+        '/api/info': ('POST', '/api/info', {'url': 'https://stub.invalid/cold?latency=0'}),
+        '/api/info/lite': ('POST', '/api/info/lite', {'url': 'https://stub.invalid/cold?latency=0'}),
+        '/api/thumbnail/proxy': ('GET', f'/api/thumbnail/proxy?url={media_base}/thumb.jpg&w=320', None)
+    }
+
+
+def sample(request, env):
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, json.dumps(request), json.dumps(HEAVY_MODULES)],
+            cwd=REPO_DIR, env=dict(env, TMPDIR=tmp), capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per route (median is reported)')
+    parser.add_argument('--budget-ms', type=float, help='Fail if import + first /health request exceeds this')
+    parser.add_argument('--info-budget-ms', type=float, help='Fail if import + first /api/info request exceeds this')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help='Extra app environment (repeatable)')
+    args = parser.parse_args()
+
+    media = MediaServer(video_size=1024 * 1024).start()
+    env = dict(
+        os.environ,
+        VERCEL='1',
+        PYTHONPATH=os.pathsep.join([REPO_DIR, BENCH_DIR, os.environ.get('PYTHONPATH', '')]),
+        STUB_MEDIA_BASE=media.base_url,
+        PYTHONDONTWRITEBYTECODE='1'
+    )
+    env.update(item.split('=', 1) for item in args.env)
+
+    print(f"{'route':<28} {'import ms':>10} {'request ms':>11} {'total ms':>9}  modules loaded")
+    totals = {}
+    try:
+        for name, request in routes(media.base_url).items():
+            samples = [sample(request, env) for _ in range(args.runs)]
+            import_ms = statistics.median(s['import_ms'] for s in samples)
+            request_ms = statistics.median(s['request_ms'] for s in samples)
+            totals[name] = statistics.median(s['import_ms'] + s['request_ms'] for s in samples)
+            statuses = sorted({s['status'] for s in samples})
+            status = '' if statuses == [200] else f'  (status {statuses})'
+            print(f"{name:<28} {import_ms:10.1f} {request_ms:11.1f} {totals[name]:9.1f}  "
+                  f"{', '.join(samples[-1]['modules']) or '-'}{status}")
+    finally:
+        media.stop()
+
+    over_budget = False
+    for route, budget in (('/health', args.budget_ms), ('/api/info', args.info_budget_ms)):
+        if budget is None:
+            continue
+        if totals[route] > budget:
+            print(f"Cold start of {route} {totals[route]:.1f} ms exceeds the {budget:.0f} ms budget")
+            over_budget = True
+        else:
+            print(f"Cold start of {route} {totals[route]:.1f} ms is within the {budget:.0f} ms budget")
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
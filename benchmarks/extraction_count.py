@@ -0,0 +1,100 @@
+"""Count extractor invocations per download request, before and after.
+
+Serves a small media file from a local HTTP server (handled by yt-dlp's
+generic extractor), then compares:
+
+  legacy      - the old extract_info() + download() sequence
+  cold        - POST /api/download/video with nothing cached
+  info+cache  - POST /api/info, then download the same URL (info cache hit)
+
+Run from the repository root:  python benchmarks/extraction_count.py
+"""
+import http.server
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+os.environ.setdefault('RATE_LIMIT', '0')  # one client sends every request
+
+import app as app_module
+
+logging.getLogger('app').setLevel(logging.WARNING)
+
+calls = {'extract': 0}
+_original_extract = InfoExtractor.extract
+
+
+def counting_extract(self, url):
+    calls['extract'] += 1
+    return _original_extract(self, url)
+
+
+def serve_media(directory):
+    handler = lambda *args, **kwargs: http.server.SimpleHTTPRequestHandler(
+        *args, directory=directory, **kwargs
+    )
+    http.server.SimpleHTTPRequestHandler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    # The generic extractor closes its probe request early; ignore the broken pipes
+    server.handle_error = lambda *args: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_download(url):
+    temp_dir = tempfile.mkdtemp()
+    opts = app_module.get_ydl_opts(output_path=os.path.join(temp_dir, '%(title)s.%(ext)s'))
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.extract_info(url, download=False)
+        ydl.download([url])
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def measure(name, func, runs):
+    before = calls['extract']
+    for i in range(runs):
+        func(i)
+    per_request = (calls['extract'] - before) / runs
+    print(f"{name:<12} {per_request:>6.2f} extractions/request")
+
+
+def main(runs=5):
+    media_dir = tempfile.mkdtemp()
+    for i in range(runs * 3):
+        with open(os.path.join(media_dir, f'clip{i}.mp4'), 'wb') as f:
+            f.write(os.urandom(256 * 1024))
+    server = serve_media(media_dir)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    InfoExtractor.extract = counting_extract
+    client = app_module.app.test_client()
+
+    def cold(i):
+        client.post('/api/download/video', data={'url': f'{base}/clip{runs + i}.mp4'})
+
+    def after_info(i):
+        url = f'{base}/clip{runs * 2 + i}.mp4'
+        client.post('/api/info', json={'url': url})
+        before = calls['extract']
+        client.post('/api/download/video', data={'url': url})
+        print(f"  download after /api/info: {calls['extract'] - before} extractions")
+
+    try:
+        measure('legacy', lambda i: legacy_download(f'{base}/clip{i}.mp4'), runs)
+        measure('cold', cold, runs)
+        measure('info+cache', after_info, runs)
+    finally:
+        InfoExtractor.extract = _original_extract
+        server.shutdown()
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
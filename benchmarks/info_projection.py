@@ -0,0 +1,132 @@
+"""Per-request CPU and payload size of the /api/info response projection.
+
+Compares the legacy two-pass builder (full thumbnails list and description)
+with project_info()/build_info_response(), cold and memoized.
+
+Usage (from the repository root):
+    python benchmarks/info_projection.py [info.json ...]
+
+Pass info dicts recorded with `yt-dlp -J <url> > info.json`; without
+arguments a synthetic heavy page (hundreds of formats) is used.
+"""
+import gzip
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('RATE_LIMIT', '0')  # one client sends every request
+
+import app as app_module
+
+logging.getLogger('app').setLevel(logging.WARNING)
+
+
+def synthetic_info(formats=400, thumbnails=60, seed=1):
+    rng = random.Random(seed)
+    heights = [144, 240, 360, 480, 720, 1080, 1440, 2160]
+    info = {
+        'id': 'synthetic', 'title': 'Synthetic heavy page', 'uploader': 'bench',
+        'duration': 3600, 'view_count': 123456, 'like_count': 789,
+        'description': 'lorem ipsum ' * 400, 'upload_date': '20240101',
+        'extractor': 'youtube', 'webpage_url': 'https://example.com/watch?v=synthetic',
+        'thumbnail': 'https://example.com/maxres.jpg',
+        'thumbnails': [
+            {'url': f'https://example.com/thumb{i}.jpg', 'width': 120 + i, 'height': 90 + i,
+             'id': str(i), 'preference': -i, 'resolution': f'{120 + i}x{90 + i}'}
+            for i in range(thumbnails)
+        ],
+        'formats': []
+    }
+    for i in range(formats):
+        kind = rng.choice(('video', 'audio', 'muxed'))
+        height = rng.choice(heights)
+        info['formats'].append({
+            'format_id': str(i), 'ext': rng.choice(('mp4', 'webm', 'm4a')),
+            'vcodec': 'none' if kind == 'audio' else 'avc1.64001F',
+            'acodec': 'none' if kind == 'video' else 'mp4a.40.2',
+            'height': None if kind == 'audio' else height,
+            'width': None if kind == 'audio' else height * 16 // 9,
+            'fps': None if kind == 'audio' else rng.choice((24, 30, 60)),
+            'abr': rng.choice((48, 64, 128, 160)) if kind == 'audio' else None,
+            'filesize': rng.randint(10 ** 6, 10 ** 9),
+            'url': f'https://example.com/media/{i}?' + 'sig=' + 'x' * 300,
+            'http_headers': {'User-Agent': 'bench'}, 'protocol': 'https'
+        })
+    return info
+
+
+def legacy_response(info, url):
+    """The /api/info response as built before the single-pass projection"""
+    video_info = {
+        'id': info.get('id', ''), 'title': info.get('title', 'Unknown Title'),
+        'uploader': info.get('uploader', 'Unknown Uploader'), 'duration': info.get('duration', 0),
+        'view_count': info.get('view_count', 0), 'like_count': info.get('like_count', 0),
+        'description': info.get('description', '')[:500] + '...' if info.get('description', '') else '',
+        'upload_date': info.get('upload_date', ''), 'extractor': info.get('extractor', ''),
+        'webpage_url': info.get('webpage_url', url), 'thumbnail': info.get('thumbnail', ''),
+        'thumbnails': info.get('thumbnails', [])
+    }
+    video_formats, audio_formats = [], []
+    formats = info.get('formats', [])
+    seen = set()
+    for fmt in formats:
+        if fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none':
+            height = fmt.get('height')
+            if height and height not in seen:
+                label = f"{height}p" + (f"{fmt['fps']}" if fmt.get('fps') else '')
+                video_formats.append({
+                    'format_id': fmt['format_id'], 'quality': label, 'height': height,
+                    'width': fmt.get('width'), 'ext': fmt.get('ext', 'mp4'),
+                    'filesize': fmt.get('filesize'), 'fps': fmt.get('fps'),
+                    'vcodec': fmt.get('vcodec'), 'acodec': fmt.get('acodec')
+                })
+                seen.add(height)
+    seen = set()
+    for fmt in formats:
+        if fmt.get('acodec') != 'none' and fmt.get('vcodec') == 'none':
+            abr = fmt.get('abr')
+            if abr and abr not in seen:
+                audio_formats.append({
+                    'format_id': fmt['format_id'], 'quality': f"{int(abr)}kbps", 'abr': abr,
+                    'ext': fmt.get('ext', 'mp3'), 'filesize': fmt.get('filesize'),
+                    'acodec': fmt.get('acodec')
+                })
+                seen.add(abr)
+    video_formats.sort(key=lambda x: x.get('height', 0), reverse=True)
+    audio_formats.sort(key=lambda x: x.get('abr', 0), reverse=True)
+    return {'success': True, 'info': video_info,
+            'formats': {'video': video_formats[:10], 'audio': audio_formats[:6]}}
+
+
+def bench(name, build, runs):
+    build()  # warm up one-time costs (extractor regexes behind cache_key)
+    start = time.perf_counter()
+    for _ in range(runs):
+        body = json.dumps(build(), separators=(',', ':')).encode()
+    per_call = (time.perf_counter() - start) / runs * 1e6
+    print(f"  {name:<18} {per_call:>9.1f} us/req  {len(body):>8} B json  "
+          f"{len(gzip.compress(body, 6)):>7} B gzip")
+
+
+def main(paths, runs=2000):
+    fixtures = [(path, json.load(open(path))) for path in paths] or [('synthetic', synthetic_info())]
+    for name, info in fixtures:
+        url = info.get('webpage_url', 'https://example.com')
+        print(f"{name}: {len(info.get('formats') or [])} formats, "
+              f"{len(info.get('thumbnails') or [])} thumbnails")
+        bench('legacy', lambda: legacy_response(info, url), runs)
+
+        def cold():
+            info.pop(app_module.PROJECTION_KEY, None)
+            return app_module.build_info_response(info, url)
+        bench('projection', cold, runs)
+        bench('projection (memo)', lambda: app_module.build_info_response(info, url), runs)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
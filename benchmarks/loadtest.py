@@ -0,0 +1,322 @@
+"""Offline load test of the HTTP API against the stub extractor and a local media server.
+
+Starts media_server.MediaServer and the app (werkzeug, threaded) in a
+subprocess with its scratch, artifact and thumbnail directories under one
+temp root, then runs each scenario with N concurrent clients:
+
+  info       POST /api/info
+  video      POST /api/download/video (720p)
+  audio      POST /api/download/audio (128 kbps)
+  thumbnail  GET  /api/thumbnail/proxy (resized to 640 px wide)
+
+Requests cycle over --videos distinct ids, so caches see the same repeat
+rate from run to run. Reports throughput, p50/p95/p99 latency, the app's
+peak RSS and peak disk usage of the temp root per scenario.
+
+--save-baseline writes the results to a JSON file; --baseline compares
+against one and exits 1 if any metric is more than --tolerance worse.
+Baselines are machine-specific: benchmarks/baseline.json holds a run with
+the default settings for reference, but record your own on the machine
+you compare on.
+
+Usage (from the repository root):
+    python benchmarks/loadtest.py [--concurrency 8] [--requests 64] [--scenarios info,video]
+        [--latency 0.05] [--bandwidth 20] [--save-baseline FILE | --baseline FILE]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from media_server import MediaServer
+
+SCENARIOS = ('info', 'video', 'audio', 'thumbnail')
+
+# metric -> True if higher is better
+METRICS = {
+    'throughput_rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+    'peak_disk_mb': False
+}
+
+RUNNER = (
+    "import sys; from werkzeug.serving import run_simple; import app; "
+    "run_simple('127.0.0.1', int(sys.argv[1]), app.app, threaded=True)"
+)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def disk_mb(root):
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+class Monitor:
+    """Polls the app's RSS and the temp root's size while a scenario runs"""
+
+    def __init__(self, pid, root, interval=0.1):
+        self.pid = pid
+        self.root = root
+        self.interval = interval
+        self.peak_rss = 0.0
+        self.peak_disk = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, rss_mb(self.pid))
+        self.peak_disk = max(self.peak_disk, disk_mb(self.root))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+
+class AppServer:
+    def __init__(self, root, media_base, latency, no_artifact_cache=False):
+        self.root = root
+        self.port = free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.log_path = os.path.join(root, 'app.log')
+        self.env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join([REPO_DIR, BENCH_DIR, os.environ.get('PYTHONPATH', '')]),
+            STUB_MEDIA_BASE=media_base,
+            STUB_LATENCY=str(latency),
+            SCRATCH_DIR=os.path.join(root, 'scratch'),
+            ARTIFACT_CACHE_DIR=os.path.join(root, 'artifacts'),
+            THUMBNAIL_CACHE_DIR=os.path.join(root, 'thumbnails'),
+            COOKIES_FILE=os.path.join(root, 'cookies.txt'),
+            RATE_LIMIT='0'  # every client is 127.0.0.1
+        )
+        if no_artifact_cache:
+            self.env['ARTIFACT_CACHE_BYTES'] = '0'
+        self.process = None
+
+    def start(self, timeout=60):
+        log = open(self.log_path, 'w')
+        self.process = subprocess.Popen([sys.executable, '-c', RUNNER, str(self.port)],
+                                        cwd=REPO_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'App exited with {self.process.returncode}, see {self.log_path}')
+            try:
+                if requests.get(f'{self.base_url}/health', timeout=1).ok:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f'App did not start within {timeout}s, see {self.log_path}')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(10)
+
+
+def make_request(scenario, app_url, media_base, video):
+    """Return (method, url, kwargs) for one request of a scenario"""
+    page_url = f'https://stub.invalid/load-{video}'
+    if scenario == 'info':
+        return 'POST', f'{app_url}/api/info', {'json': {'url': page_url}}
+    if scenario == 'video':
+        return 'POST', f'{app_url}/api/download/video', {'data': {'url': page_url, 'format_id': '720p'}}
+    if scenario == 'audio':
+        return 'POST', f'{app_url}/api/download/audio', {'data': {'url': page_url, 'bitrate': '128'}}
+    if scenario == 'thumbnail':
+        return 'GET', f'{app_url}/api/thumbnail/proxy', {'params': {'url': f'{media_base}/thumb/{video}.jpg', 'w': 640}}
+    raise ValueError(scenario)
+
+
+def run_scenario(scenario, app, media_base, concurrency, total, videos):
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, url, kwargs = make_request(scenario, app.base_url, media_base, i % videos)
+        start = time.perf_counter()
+        size = 0
+        try:
+            with session.request(method, url, stream=True, timeout=300, **kwargs) as response:
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, size, ok
+
+    with Monitor(app.process.pid, app.root) as monitor:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for seconds, _, ok in results if ok]
+    errors = sum(1 for _, _, ok in results if not ok)
+    if not latencies:
+        return {'requests': total, 'errors': errors}
+    return {
+        'requests': total,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'mib_per_s': round(sum(size for _, size, ok in results if ok) / elapsed / (1024 * 1024), 2),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'peak_rss_mb': round(monitor.peak_rss, 1),
+        'peak_disk_mb': round(monitor.peak_disk, 1)
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print regressions against baseline; returns True if there were none"""
+    if baseline.get('config') != results['config']:
+        print(f"warning: baseline was recorded with {baseline.get('config')}")
+    ok = True
+    for scenario, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous:
+            continue
+        if current.get('errors', 0) > previous.get('errors', 0):
+            print(f"REGRESSION {scenario}: errors {previous.get('errors', 0)} -> {current['errors']}")
+            ok = False
+        for metric, higher_is_better in METRICS.items():
+            if metric not in current or not previous.get(metric):
+                continue
+            change = (current[metric] - previous[metric]) / previous[metric]
+            if (-change if higher_is_better else change) > tolerance:
+                print(f"REGRESSION {scenario}: {metric} {previous[metric]} -> {current[metric]} ({change:+.0%})")
+                ok = False
+    return ok
+
+
+def print_results(results):
+    print(f"{'scenario':<10} {'req/s':>8} {'MiB/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'rss MiB':>8} {'disk MiB':>9} {'errors':>7}")
+    for scenario, r in results['scenarios'].items():
+        if 'throughput_rps' not in r:
+            print(f"{scenario:<10} {'all requests failed':>54} {r['errors']:>7}")
+            continue
+        print(f"{scenario:<10} {r['throughput_rps']:8.2f} {r['mib_per_s']:8.2f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+              f"{r['p99_ms']:9.1f} {r['peak_rss_mb']:8.1f} {r['peak_disk_mb']:9.1f} {r['errors']:7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', 1)[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of ' + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=64, help='Requests per scenario')
+    parser.add_argument('--videos', type=int, default=16, help='Distinct video ids to cycle over')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub extractor latency in seconds')
+    parser.add_argument('--media-latency', type=float, default=0.0, help='Media server time to first byte in seconds')
+    parser.add_argument('--bandwidth', type=float, default=0, help='Per-connection media bandwidth in MiB/s (0 = unlimited)')
+    parser.add_argument('--size', type=int, default=8, help='Video size in MiB')
+    parser.add_argument('--no-artifact-cache', action='store_true', help='Make every download hit the media server')
+    parser.add_argument('--baseline', help='Compare against this results file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression (default 0.2)')
+    parser.add_argument('--save-baseline', help='Write the results to this file')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    root = tempfile.mkdtemp(prefix='mdownloader-loadtest-')
+    media = MediaServer(video_size=args.size * 1024 * 1024, latency=args.media_latency,
+                        bandwidth=args.bandwidth * 1024 * 1024 or None).start()
+    app = AppServer(root, media.base_url, args.latency, args.no_artifact_cache)
+    config = {k: getattr(args, k) for k in ('concurrency', 'requests', 'videos', 'latency', 'media_latency',
+                                             'bandwidth', 'size', 'no_artifact_cache')}
+    results = {'config': config, 'scenarios': {}}
+    try:
+        app.start()
+        for scenario in scenarios:
+            results['scenarios'][scenario] = run_scenario(
+                scenario, app, media.base_url, args.concurrency, args.requests, args.videos
+            )
+    finally:
+        app.stop()
+        media.stop()
+
+    print_results(results)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {args.save_baseline}")
+
+    failed = any(r['errors'] for r in results['scenarios'].values())
+    if failed:
+        print(f"Some requests failed, app log kept at {app.log_path}")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Local HTTP media and thumbnail server for offline benchmarks.
+
+Serves with Range support:
+  /video.mp4, /media/<anything>  the video body (random bytes, or the body passed in)
+  /audio.m4a                     a real AAC file when ffmpeg is available, else random bytes
+  /thumb*                        a JPEG (generated with Pillow when installed)
+
+Each response waits ``latency`` seconds before the first byte and is then
+throttled to ``bandwidth`` bytes/second per connection, which is how a
+window-limited long-haul TCP stream behaves.
+"""
+import io
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHUNK = 64 * 1024
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients hanging up mid-response or on idle keep-alive connections
+
+
+def make_audio(seconds=30):
+    """A real m4a file if ffmpeg is available, otherwise None"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    path = os.path.join(tempfile.mkdtemp(), 'audio.m4a')
+    subprocess.run([ffmpeg, '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                    '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', path], check=True)
+    with open(path, 'rb') as f:
+        body = f.read()
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    return body
+
+
+def make_thumbnail(width=1280, height=720):
+    try:
+        from PIL import Image
+    except ImportError:
+        return os.urandom(64 * 1024)
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    output = io.BytesIO()
+    img.save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+class MediaServer:
+    def __init__(self, video=None, video_size=8 * 1024 * 1024, latency=0.0, bandwidth=None):
+        self.bodies = {
+            'video': video if video is not None else os.urandom(video_size),
+            'audio': make_audio() or os.urandom(512 * 1024),
+            'thumb': make_thumbnail()
+        }
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def body_for(self, path):
+        if path.startswith('/thumb'):
+            return self.bodies['thumb'], 'image/jpeg'
+        if path.startswith('/audio'):
+            return self.bodies['audio'], 'audio/mp4'
+        if path.startswith(('/video', '/media')):
+            return self.bodies['video'], 'video/mp4'
+        return None, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body, content_type = server.body_for(self.path.split('?', 1)[0])
+                if body is None:
+                    self.send_error(404)
+                    return
+                first, last = 0, len(body) - 1
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    first = int(match.group(1))
+                    last = min(int(match.group(2)) if match.group(2) else last, last)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {first}-{last}/{len(body)}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(last - first + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', f'"{len(body)}"')
+                self.end_headers()
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                start = time.monotonic()
+                sent = 0
+                try:
+                    for offset in range(first, last + 1, CHUNK):
+                        chunk = body[offset:min(offset + CHUNK, last + 1)]
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if server.bandwidth:
+                            ahead = sent / server.bandwidth - (time.monotonic() - start)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                with server._lock:
+                    server.bytes_sent += sent
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
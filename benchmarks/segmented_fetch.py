@@ -0,0 +1,78 @@
+"""Single-stream vs segmented download time against a high-latency server.
+
+Serves a generated file from media_server.MediaServer with one round trip
+of latency and each connection limited to 64 KiB per round trip, the way
+a window-limited long-haul TCP stream is. Measures:
+
+  * fetch_segmented() directly with 1, 2, 4 and 8 segments
+  * a run of downloads letting SegmentTuner pick the segment count
+  * /api/download/video end to end (stub extractor) with yt-dlp's own
+    downloader vs SEGMENTED_DOWNLOADS
+
+Usage (from the repository root):
+    python benchmarks/segmented_fetch.py [size MiB] [rtt ms]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)  # exposes the yt_dlp_plugins stub extractor
+
+os.environ.setdefault('ARTIFACT_CACHE_BYTES', '0')  # every download must hit the server
+os.environ.setdefault('RATE_LIMIT', '0')  # one client sends every request
+
+from media_server import CHUNK, MediaServer
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(size_mib=16, rtt_ms=20):
+    body = os.urandom(size_mib * 1024 * 1024)
+    rtt = rtt_ms / 1000
+    server = MediaServer(video=body, latency=rtt, bandwidth=CHUNK / rtt).start()
+    base = server.base_url
+    os.environ['STUB_MEDIA_BASE'] = base
+
+    import app as app_module
+    from segmented import SegmentTuner, fetch_segmented
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    print(f"{size_mib} MiB file, {rtt_ms} ms per round trip / 64 KiB window")
+    path = os.path.join(tempfile.mkdtemp(), 'out.bin')
+    session = app_module.get_http_session()
+    for segments in (1, 2, 4, 8):
+        seconds = timed(lambda: fetch_segmented(session, f'{base}/video.mp4', {}, path, segments))
+        assert open(path, 'rb').read() == body
+        print(f"  segments={segments}  {seconds:6.2f} s  {size_mib / seconds:6.1f} MiB/s")
+
+    tuner = SegmentTuner(initial=1, max_segments=8)
+    picks = []
+    for _ in range(6):
+        segments = tuner.segments('127.0.0.1')
+        picks.append(segments)
+        fetch_segmented(session, f'{base}/video.mp4', {}, path, segments, [tuner.hook('127.0.0.1', segments)])
+    print(f"  tuner picks: {picks}")
+
+    client = app_module.app.test_client()
+    for label, segmented in (('yt-dlp', False), ('segmented', True)):
+        app_module.SEGMENTED_DOWNLOADS = segmented
+
+        def download():
+            response = client.post('/api/download/video',
+                                   data={'url': f'https://stub.invalid/seg-{label}?latency=0', 'format_id': '720p'})
+            assert response.status_code == 200 and response.data == body, response.status_code
+        print(f"  /api/download/video {label:<10} {timed(download):6.2f} s")
+    server.stop()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 16, float(args[1]) if len(args) > 1 else 20)
@@ -0,0 +1,59 @@
+"""p50/p99 /api/info latency with and without the YoutubeDL pool.
+
+Uses the offline stub extractor (benchmarks/yt_dlp_plugins), so no network
+is needed. Every request uses a new video id to bypass the info cache and
+measure extraction, including YoutubeDL construction.
+
+Usage (from the repository root):
+    python benchmarks/ydl_pool_latency.py [requests] [stub latency seconds]
+"""
+import logging
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)  # exposes the yt_dlp_plugins stub extractor
+
+os.environ.setdefault('RATE_LIMIT', '0')  # one client sends every request
+
+import app as app_module
+
+logging.getLogger('app').setLevel(logging.WARNING)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(client, label, requests, latency):
+    samples = []
+    for i in range(requests):
+        url = f'https://stub.invalid/{label}-{i}?latency={latency}'
+        start = time.perf_counter()
+        response = client.post('/api/info', json={'url': url})
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    print(f"{label:<8} p50 {percentile(samples, 50):7.2f} ms   p99 {percentile(samples, 99):7.2f} ms   "
+          f"mean {statistics.mean(samples):7.2f} ms")
+
+
+def main(requests=200, latency=0.0):
+    client = app_module.app.test_client()
+    pool = app_module.ydl_pool
+
+    pool.enabled = False
+    run(client, 'no-pool', requests, latency)
+
+    pool.enabled = True
+    pool.warm(app_module.get_info_ydl_opts())
+    run(client, 'pool', requests, latency)
+    print(pool.stats())
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 200, float(args[1]) if len(args) > 1 else 0.0)
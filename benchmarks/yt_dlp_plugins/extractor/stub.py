@@ -0,0 +1,78 @@
+"""Offline stub extractor for benchmarks.
+
+Loaded by yt-dlp as a plugin when the benchmarks directory is on sys.path.
+Handles https://stub.invalid/<id>[?latency=<seconds>] and returns a
+synthetic info dict after sleeping for the requested latency (default
+STUB_LATENCY env var, 0.05s), standing in for the network round trips of
+a real extractor. With ?fail=<message> it raises that error instead
+(e.g. "Private video" or "HTTP Error 503").
+
+If STUB_INFO_DIR holds <id>.json (an info dict recorded from a real site,
+e.g. with ``yt-dlp -J URL``), that is returned instead, with every format
+and thumbnail URL pointed at STUB_MEDIA_BASE so nothing leaves the host.
+"""
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError
+
+
+class StubIE(InfoExtractor):
+    IE_NAME = 'stub'
+    _VALID_URL = r'https?://stub\.invalid/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        query = parse_qs(urlparse(url).query)
+        latency = float(query.get('latency', [os.environ.get('STUB_LATENCY', 0.05)])[0])
+        time.sleep(latency)
+        if 'fail' in query:
+            raise ExtractorError(query['fail'][0], expected=True)
+        media_base = os.environ.get('STUB_MEDIA_BASE', 'http://127.0.0.1:9/media')
+        recorded = self._recorded_info(video_id, media_base)
+        if recorded is not None:
+            return recorded
+        return {
+            'id': video_id,
+            'title': f'Stub video {video_id}',
+            'uploader': 'stub',
+            'duration': 60,
+            'thumbnail': f'{media_base}/thumb.jpg',
+            'formats': [
+                {'format_id': f'{height}p', 'url': f'{media_base}/video.mp4?h={height}', 'ext': 'mp4',
+                 'height': height, 'width': height * 16 // 9, 'vcodec': 'avc1', 'acodec': 'mp4a'}
+                for height in (360, 720)
+            ] + [
+                {'format_id': 'audio', 'url': f'{media_base}/audio.m4a', 'ext': 'm4a',
+                 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128}
+            ]
+        }
+
+    @staticmethod
+    def _recorded_info(video_id, media_base):
+        info_dir = os.environ.get('STUB_INFO_DIR')
+        path = info_dir and os.path.join(info_dir, f'{video_id}.json')
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            info = json.load(f)
+        for key in ('requested_formats', 'requested_downloads', 'url', 'manifest_url', 'webpage_url', 'extractor', 'extractor_key'):
+            info.pop(key, None)
+        formats = []
+        for fmt in info.get('formats') or ():
+            if fmt.get('protocol', 'https').startswith(('m3u8', 'http_dash', 'f4m', 'ism', 'mhtml')):
+                continue  # The media server only does progressive downloads
+            kind = 'audio' if fmt.get('vcodec') == 'none' else 'media'
+            fmt = {k: v for k, v in fmt.items() if k not in ('fragments', 'manifest_url', 'http_headers', 'protocol')}
+            fmt['url'] = f"{media_base}/{kind}/{fmt.get('format_id')}.{fmt.get('ext', 'mp4')}"
+            formats.append(fmt)
+        info['formats'] = formats
+        info['thumbnails'] = [
+            {**t, 'url': f'{media_base}/thumb/{i}.jpg'} for i, t in enumerate(info.get('thumbnails') or ())
+        ]
+        info['thumbnail'] = f'{media_base}/thumb.jpg'
+        info['id'] = video_id
+        return info
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+
+
+class CookieStore:
+    """cookies.txt parsed once and shared by every YoutubeDL instance.
+
+    The file is re-parsed only when its inode, mtime or size changes
+    (checked at most every ``check_interval`` seconds). Instances get the
+    jar through attach() instead of the ``cookiefile`` option, so they
+    neither parse the file on construction nor write it back on close().
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._jar = None
+        self._signature = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def jar(self):
+        """The current cookie jar, or None when there is no cookies file"""
+        if self.path is None:
+            return None
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return self._jar
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return self._jar
+            self._checked = now
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self._jar, self._signature = None, None
+                return None
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature:
+                from yt_dlp.cookies import YoutubeDLCookieJar
+                jar = YoutubeDLCookieJar(self.path)
+                jar.load()
+                self._jar, self._signature = jar, signature
+                self.loads += 1
+            return self._jar
+
+    def attach(self, ydl):
+        """Make ydl use the shared jar; a no-op if it already does"""
+        jar = self.jar()
+        if jar is None or ydl.__dict__.get('cookiejar') is jar:
+            return ydl
+        # YoutubeDL.cookiejar is a cached_property; its request handlers capture the
+        # jar when first built, so drop them to have them rebuilt around the new one
+        ydl.__dict__['cookiejar'] = jar
+        director = ydl.__dict__.pop('_request_director', None)
+        if director is not None:
+            director.close()
+        return ydl
+
+    def stats(self):
+        jar = self._jar
+        return {
+            'path': self.path,
+            'loaded': jar is not None,
+            'cookies': len(jar) if jar is not None else 0,
+            'loads': self.loads
+        }
+
+
+def create_cookie_store():
+    """Shared jar for COOKIES_FILE (default cookies.txt); disabled on Vercel"""
+    if os.environ.get('VERCEL') == '1':
+        return CookieStore(None)
+    return CookieStore(os.environ.get('COOKIES_FILE', 'cookies.txt'))
@@ -0,0 +1,283 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Error classes, matched in order against the message yt-dlp reports
+ERROR_PATTERNS = (
+    # The caller asked for a format the video doesn't have; never cached (see app.extract_sanitized)
+    ('format', re.compile(r'requested format is not available', re.I)),
+    ('private', re.compile(r'private video|video is private|members[- ]only', re.I)),
+    ('auth', re.compile(r'sign in|log ?in|login required|age[- ]restrict|confirm your age|use --cookies', re.I)),
+    ('geo', re.compile(r'not available in your country|geo[- ]?restrict|from your location', re.I)),
+    ('removed', re.compile(r'unavailable|has been removed|no longer available|does not exist|not found|terminated', re.I)),
+    ('unsupported', re.compile(r'unsupported url', re.I)),
+    ('throttled', re.compile(r'http error 429|too many requests|rate[- ]?limit', re.I)),
+    ('network', re.compile(r'timed out|timeout|connection|name resolution|ssl|http error 5\d\d', re.I)),
+)
+
+# Seconds a failed URL is answered from the negative cache, per error class.
+# Content errors say the video itself is off limits, so they are kept longer;
+# the rest may clear up on the next try.
+NEGATIVE_TTLS = {
+    'private': 600,
+    'removed': 600,
+    'auth': 300,
+    'geo': 600,
+    'unsupported': 3600,
+    'throttled': 30,
+    'network': 15,
+    'error': 30
+}
+
+# Classes that mean the site answered normally; they don't count against its breaker
+CONTENT_ERRORS = frozenset(('private', 'removed', 'auth', 'geo', 'unsupported'))
+
+
+def classify_error(message):
+    for error_class, pattern in ERROR_PATTERNS:
+        if pattern.search(message or ''):
+            return error_class
+    return 'error'
+
+
+class ErrorRecorder:
+    """yt-dlp ``logger`` that remembers the last error reported on each thread.
+
+    With ignoreerrors yt-dlp reports a failed extraction only through its
+    logger and returns None, so this is where the reason comes from.
+    Errors are passed on to the standard logging module.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self._local.last = msg
+        logger.warning("%s", msg)
+
+    def pop(self):
+        """The last error on this thread since the previous pop, or None"""
+        msg = getattr(self._local, 'last', None)
+        self._local.last = None
+        return msg
+
+    def __repr__(self):
+        # Stable, so options holding the recorder still fingerprint the same (see ydl_pool.py)
+        return 'ErrorRecorder()'
+
+
+class NegativeCache:
+    """Short-lived memory of failed extractions, keyed like the info cache.
+
+    Each entry keeps the error class and message. A URL that keeps failing
+    is remembered longer each time: the class's TTL doubles with every
+    repeat, up to ``max_ttl``.
+    """
+
+    def __init__(self, ttls=NEGATIVE_TTLS, max_ttl=3600, max_entries=4096):
+        self.ttls = ttls
+        self.max_ttl = max_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, error_class, message, failures)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stored = 0
+
+    def get(self, key):
+        """(error_class, message) for a recent failure of key, or None; counts as a hit"""
+        failure = self.peek(key)
+        if failure is not None:
+            with self._lock:
+                self.hits += 1
+        return failure
+
+    def peek(self, key):
+        """Like get() without counting a hit"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            return entry[1], entry[2]
+
+    def add(self, key, error_class, message):
+        """Remember a failure of key; returns how long it will be remembered"""
+        now = time.time()
+        base_ttl = self.ttls.get(error_class, self.ttls['error'])
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            # A failure soon after the previous entry expired counts as a repeat
+            repeat = previous is not None and previous[0] + base_ttl > now
+            failures = previous[3] + 1 if repeat else 1
+            ttl = min(base_ttl * 2 ** (failures - 1), self.max_ttl)
+            self._entries[key] = (now + ttl, error_class, message, failures)
+            self.stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return ttl
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            classes = {}
+            for expires, error_class, _, _ in self._entries.values():
+                if expires > now:
+                    classes[error_class] = classes.get(error_class, 0) + 1
+            return {'entries': sum(classes.values()), 'by_class': classes, 'hits': self.hits, 'stored': self.stored}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of extracting from a site whose breaker is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} is failing, extraction paused')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _Breaker:
+    def __init__(self, cooldown):
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self.probing = False
+        self.trips = 0
+
+
+class CircuitBreakers:
+    """One circuit breaker per extractor.
+
+    ``threshold`` consecutive site failures (timeouts, 5xx, 429s,
+    unexplained errors; not private or removed videos) open the breaker:
+    extractions for that site fail fast with CircuitOpen for ``cooldown``
+    seconds. Then it is half-open and lets a single probe through. A
+    successful probe closes it; a failed one reopens it with the cooldown
+    doubled, up to ``max_cooldown``.
+    """
+
+    def __init__(self, threshold=5, cooldown=30, max_cooldown=600, enabled=True):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.enabled = enabled
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def check(self, name):
+        """Raise CircuitOpen if name's breaker is open and still cooling down; claims nothing"""
+        if not self.enabled:
+            return
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None or breaker.state != 'open':
+                return
+            retry_after = breaker.opened_at + breaker.cooldown - time.monotonic()
+            if retry_after <= 0:
+                return
+            self.rejected += 1
+        raise CircuitOpen(name, retry_after)
+
+    def before(self, name):
+        """Admit an extraction for name or raise CircuitOpen.
+
+        Returns True when the call is the half-open probe; pass that to after().
+        """
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None or breaker.state == 'closed':
+                return False
+            if breaker.state == 'open' and now - breaker.opened_at >= breaker.cooldown:
+                breaker.state = 'half_open'
+            if breaker.state == 'half_open' and not breaker.probing:
+                breaker.probing = True
+                return True
+            self.rejected += 1
+            if breaker.state == 'open':
+                retry_after = breaker.opened_at + breaker.cooldown - now
+            else:
+                retry_after = 1.0  # A probe is in flight
+        raise CircuitOpen(name, retry_after)
+
+    def after(self, name, ok, probe=False):
+        """Record the outcome of an admitted extraction"""
+        if not self.enabled:
+            return
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                if ok:
+                    return
+                breaker = self._breakers[name] = _Breaker(self.base_cooldown)
+            if probe:
+                breaker.probing = False
+            if ok:
+                if breaker.state != 'closed':
+                    logger.info("Circuit for %s closed", name)
+                breaker.state = 'closed'
+                breaker.failures = 0
+                breaker.cooldown = self.base_cooldown
+                return
+            breaker.failures += 1
+            if probe:
+                breaker.cooldown = min(breaker.cooldown * 2, self.max_cooldown)
+                self._trip(name, breaker)
+            elif breaker.state == 'closed' and breaker.failures >= self.threshold:
+                self._trip(name, breaker)
+
+    def _trip(self, name, breaker):
+        # Caller must hold self._lock
+        breaker.state = 'open'
+        breaker.opened_at = time.monotonic()
+        breaker.trips += 1
+        logger.warning("Circuit for %s opened for %.0fs after %d failures", name, breaker.cooldown, breaker.failures)
+
+    def open_count(self):
+        with self._lock:
+            return sum(1 for breaker in self._breakers.values() if breaker.state != 'closed')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'rejected': self.rejected,
+                'breakers': {
+                    name: {'state': b.state, 'failures': b.failures, 'cooldown': b.cooldown, 'trips': b.trips}
+                    for name, b in self._breakers.items() if b.state != 'closed' or b.failures or b.trips
+                }
+            }
+
+
+def create_negative_cache():
+    """Negative cache sized and capped from NEGATIVE_CACHE_SIZE / NEGATIVE_CACHE_MAX_TTL"""
+    return NegativeCache(
+        max_ttl=int(os.environ.get('NEGATIVE_CACHE_MAX_TTL', 3600)),
+        max_entries=int(os.environ.get('NEGATIVE_CACHE_SIZE', 4096))
+    )
+
+
+def create_circuit_breakers():
+    """Per-extractor breakers from CIRCUIT_* settings; CIRCUIT_BREAKERS=0 disables them"""
+    return CircuitBreakers(
+        threshold=int(os.environ.get('CIRCUIT_THRESHOLD', 5)),
+        cooldown=float(os.environ.get('CIRCUIT_COOLDOWN', 30)),
+        max_cooldown=float(os.environ.get('CIRCUIT_MAX_COOLDOWN', 600)),
+        enabled=os.environ.get('CIRCUIT_BREAKERS', '1') != '0'
+    )
@@ -1,15 +1,98 @@
-
-import sqlite3
+import argparse
+import io
 import os
+import pathlib
+import sqlite3
 import sys
 
+NETSCAPE_HEADER = (
+    "# Netscape HTTP Cookie File\n"
+    "# http://www.netscape.com/newsref/std/cookie_spec.html\n"
+    "# This is a generated file!  Do not edit.\n\n"
+)
+
+
+def open_cookie_db(cookie_file):
+    """Open cookies.sqlite read-only and immutable, so it works while Firefox holds its lock"""
+    uri = f"{pathlib.Path(cookie_file).resolve().as_uri()}?mode=ro&immutable=1"
+    return sqlite3.connect(uri, uri=True)
+
+
+def query_cookies(conn, domains):
+    """Yield (host, path, is_secure, is_http_only, expiry, name, value) for all domains in one pass"""
+    clauses = []
+    params = []
+    for domain in domains:
+        domain = domain.lstrip('.').lower()
+        # The domain itself, its dotted form and any subdomain, but not e.g. notyoutube.com
+        clauses.append('host = ? OR host = ? OR host LIKE ?')
+        params += [domain, f'.{domain}', f'%.{domain}']
+    cursor = conn.execute(f"""
+        SELECT host, path, isSecure, isHttpOnly, expiry, name, value
+        FROM moz_cookies
+        WHERE {' OR '.join(clauses)}
+    """, params)
+    yield from cursor
+
+
+def write_netscape_cookies(rows, out):
+    """Write cookie rows to out in Netscape format as they are read; returns the number written"""
+    out.write(NETSCAPE_HEADER)
+    count = 0
+    for host, path, is_secure, is_http_only, expiry, name, value in rows:
+        expiry = int(expiry or 0)
+        if expiry > 10 ** 11:  # Newer Firefox versions store milliseconds
+            expiry //= 1000
+        out.write('\t'.join((
+            f"#HttpOnly_{host}" if is_http_only else host,
+            'TRUE' if host.startswith('.') else 'FALSE',
+            path,
+            'TRUE' if is_secure else 'FALSE',
+            str(expiry),
+            name,
+            value
+        )) + '\n')
+        count += 1
+    return count
+
+
+def export_firefox_cookies(profile_path, domains, output_path):
+    """Stream the cookies for domains into output_path; returns the number of cookies or None on error.
+
+    The file is written next to output_path and renamed into place, so
+    readers (the app reloads cookies.txt when it changes) never see it
+    half written.
+    """
+    cookie_file = os.path.join(profile_path, 'cookies.sqlite')
+    if not os.path.exists(cookie_file):
+        print(f"Error: cookies.sqlite not found at {cookie_file}", file=sys.stderr)
+        return None
+
+    tmp_path = f"{output_path}.tmp"
+    try:
+        conn = open_cookie_db(cookie_file)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+                count = write_netscape_cookies(query_cookies(conn, domains), f)
+        finally:
+            conn.close()
+        os.replace(tmp_path, output_path)
+        return count
+
+    except (sqlite3.Error, OSError) as e:
+        print(f"Cookie export error: {e}", file=sys.stderr)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
 def get_firefox_cookies(profile_path, domain_name):
     """
-    Extracts cookies for a specific domain from a Firefox profile.
+    Extracts cookies for one or more domains from a Firefox profile.
 
     Args:
         profile_path (str): The path to the Firefox profile directory.
-        domain_name (str): The domain for which to extract cookies (e.g., '.youtube.com').
+        domain_name (str or list): The domain(s) for which to extract cookies (e.g., '.youtube.com').
 
     Returns:
         str: The cookies in Netscape format, or None if an error occurs.
@@ -19,52 +102,34 @@ def get_firefox_cookies(profile_path, domain_name):
         print(f"Error: cookies.sqlite not found at {cookie_file}", file=sys.stderr)
         return None
 
+    domains = [domain_name] if isinstance(domain_name, str) else domain_name
     try:
-        conn = sqlite3.connect(cookie_file)
-        cursor = conn.cursor()
-
-        # Query to select cookies for the specified domain
-        cursor.execute("""
-            SELECT host, path, isSecure, expiry, name, value
-            FROM moz_cookies
-            WHERE host LIKE ?
-        """, (f'%{domain_name}',))
-
-        cookies = []
-        for host, path, is_secure, expiry, name, value in cursor.fetchall():
-            cookies.append(
-                f"{host}\\t{'TRUE' if host.startswith('.') else 'FALSE'}\\t{path}\\t{'TRUE' if is_secure else 'FALSE'}\\t{int(expiry)}\\t{name}\\t{value}"
-            )
-
-        conn.close()
-        
-        # Add the Netscape header
-        header = "# Netscape HTTP Cookie File\\n"\
-                 "# http://www.netscape.com/newsref/std/cookie_spec.html\\n"\
-                 "# This is a generated file!  Do not edit.\\n\\n"
-        
-        return header + "\\n".join(cookies)
+        conn = open_cookie_db(cookie_file)
+        try:
+            out = io.StringIO()
+            write_netscape_cookies(query_cookies(conn, domains), out)
+            return out.getvalue()
+        finally:
+            conn.close()
 
     except sqlite3.Error as e:
         print(f"SQLite error: {e}", file=sys.stderr)
         return None
 
+
 if __name__ == '__main__':
-    # Path to the Firefox profile
+    parser = argparse.ArgumentParser(description='Export Firefox cookies to a Netscape cookies.txt for yt-dlp')
     # Replace with the correct profile path if necessary
-    profile_path = os.path.expanduser('~\\AppData\\Roaming\\Mozilla\\Firefox\\Profiles\\p1cyms1t.default-release-1737904046507')
-    
-    # Domain to extract cookies for
-    domain = '.youtube.com'
-
-    # Get the cookies
-    cookie_data = get_firefox_cookies(profile_path, domain)
-
-    if cookie_data:
-        # Save the cookies to a file
-        with open('cookies.txt', 'w') as f:
-            f.write(cookie_data)
-        print("YouTube cookies have been successfully exported to cookies.txt")
-    else:
-        print("Could not export YouTube cookies.")
+    parser.add_argument('profile', nargs='?', default=os.path.expanduser(
+        '~\\AppData\\Roaming\\Mozilla\\Firefox\\Profiles\\p1cyms1t.default-release-1737904046507'
+    ), help='Firefox profile directory')
+    parser.add_argument('-d', '--domain', action='append', dest='domains',
+                        help='Domain to export (repeatable, default .youtube.com)')
+    parser.add_argument('-o', '--output', default='cookies.txt', help='Output file (default cookies.txt)')
+    args = parser.parse_args()
 
+    count = export_firefox_cookies(args.profile, args.domains or ['.youtube.com'], args.output)
+    if count is not None:
+        print(f"Exported {count} cookies to {args.output}")
+    else:
+        print("Could not export cookies.")
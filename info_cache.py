@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Query parameters that never change which video a URL points at
+TRACKING_PARAMS = {
+    'feature', 'si', 'pp', 'ab_channel', 'fbclid', 'gclid', 'igshid',
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content'
+}
+
+
+def normalize_url(url):
+    """Normalize a URL so trivially different links share a cache entry"""
+    parsed = urlparse(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS
+    )
+    netloc = parsed.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return urlunparse((
+        parsed.scheme.lower(), netloc, parsed.path.rstrip('/') or '/',
+        '', urlencode(query), ''
+    ))
+
+
+@lru_cache(maxsize=8)
+def extractor_classes(allowed=None):
+    """yt-dlp's extractor classes in matching order, limited like its allowed_extractors option.
+
+    Matching a URL against all ~1800 extractors compiles their URL patterns
+    on first use, which is a large share of a cold start; with a short
+    allowed list only those are compiled.
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+
+    if not allowed:
+        # Building the name table below touches every class's IE_NAME; skip it when nothing is filtered
+        return gen_extractor_classes()
+
+    from yt_dlp.utils import orderedSet_from_options
+
+    classes = {ie.IE_NAME.lower(): ie for ie in gen_extractor_classes()}
+    names = orderedSet_from_options(allowed, {
+        'all': list(classes),
+        'default': [name for name, ie in classes.items() if ie._ENABLED]
+    }, use_regex=True)
+    return [classes[name] for name in names]
+
+
+@lru_cache(maxsize=1024)
+def cache_key(url, allowed=None):
+    """Build a cache key from the extractor and video id, falling back to the normalized URL.
+
+    allowed is the tuple of extractor names/patterns passed to yt-dlp as allowed_extractors, if any.
+    """
+    for ie in extractor_classes(allowed):
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        try:
+            video_id = ie.get_temp_id(url)
+        except Exception:
+            video_id = None
+        if video_id:
+            return f"{ie.ie_key()}:{video_id}"
+        break
+    return f"url:{normalize_url(url)}"
+
+
+class _Flight:
+    """A single in-progress load that concurrent callers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class InfoCache:
+    """TTL + LRU cache for extracted info dicts with single-flight loading.
+
+    Entries live in memory and, when ``db_path`` is set, are also written to
+    a SQLite file so they survive worker restarts and are shared between
+    gunicorn workers on the same host.
+    """
+
+    def __init__(self, max_entries=256, ttl=300, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS info_cache '
+                '(key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)'
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing/expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        value = self._db_get(key, now)
+        if value is not None:
+            with self._lock:
+                self._store(key, value, now + self.ttl)
+        return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires)
+        self._db_set(key, value, expires)
+
+    def delete(self, key):
+        """Drop an entry, e.g. when its media URLs turned out to be stale"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute('DELETE FROM info_cache WHERE key = ?', (key,))
+                    self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    def get_or_load(self, key, loader):
+        """Return (value, cached), calling loader at most once per key at a time.
+
+        Concurrent callers for a key that is already being loaded wait for
+        that load instead of starting their own. A loader result of None is
+        handed to the waiters but never cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value, True
+
+        flight, leader = self._join(key)
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+        return self._fly(key, flight, loader), False
+
+    def load_in_background(self, key, loader, executor):
+        """Start loading key on executor unless it is cached or already loading.
+
+        The load is registered before this returns, so a get_or_load for key
+        right after it waits for this load instead of starting another.
+        Returns the executor's future, or None if there was nothing to do.
+        """
+        if self.get(key) is not None:
+            return None
+        flight, leader = self._join(key)
+        if not leader:
+            return None
+        try:
+            return executor.submit(self._fly, key, flight, loader)
+        except RuntimeError as e:
+            # Executor shut down: release anyone already waiting on the flight
+            flight.error = e
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+            raise
+
+    def _join(self, key):
+        """(flight, leader) for key; the leader must run the load with _fly()"""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        return flight, leader
+
+    def _fly(self, key, flight, loader):
+        try:
+            flight.value = loader()
+            if flight.value is not None:
+                self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                'persistent': self._db is not None
+            }
+
+    def _store(self, key, value, expires):
+        # Caller must hold self._lock
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key, now):
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    'SELECT value FROM info_cache WHERE key = ? AND expires > ?', (key, now)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def _db_set(self, key, value, expires):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO info_cache (key, expires, value) VALUES (?, ?, ?)',
+                    (key, expires, json.dumps(value))
+                )
+                self._db.execute('DELETE FROM info_cache WHERE expires <= ?', (time.time(),))
+                self._db.commit()
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+
+def create_info_cache():
+    """Build the process-wide info cache from environment configuration"""
+    return InfoCache(
+        max_entries=int(os.environ.get('INFO_CACHE_SIZE', 256)),
+        ttl=int(os.environ.get('INFO_CACHE_TTL', 300)),
+        db_path=os.environ.get('INFO_CACHE_DB') or None
+    )
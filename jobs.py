@@ -0,0 +1,202 @@
+import bisect
+import itertools
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """A queued or running background download"""
+
+    def __init__(self, kind, params, client=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.client = client
+        self.host = (urlparse(params.get('url', '')).hostname or '').lower()
+        self.start_tag = 0.0  # Fair-queuing tags, set by JobManager.submit
+        self.finish_tag = 0.0
+        self.status = 'queued'
+        self.error = None
+        self.result = None  # (file_path, download_name, mimetype) once finished
+        self.scratch = None  # ScratchDir holding the job's files, released on failure or when the job is pruned
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+        if self.error:
+            data['error'] = self.error
+        if self.result:
+            data['filename'] = self.result[1]
+        return data
+
+
+class JobManager:
+    """Bounded job queue served by a fixed pool of worker threads.
+
+    Queued jobs are served in weighted fair order between clients rather
+    than first come, first served: each job is tagged with a virtual finish
+    time (the later of now and its client's previous tag, plus 1/weight)
+    and workers take the lowest tag. A client queueing twenty jobs then
+    delays someone else's single job by at most one of them instead of all
+    twenty. Workers skip over jobs whose host is already at its concurrency
+    limit, so one busy site cannot occupy every worker. Submitting while
+    the queue is full raises JobQueueFull so callers can push back.
+    Finished jobs are forgotten, and their files deleted, job_ttl seconds
+    after they end; failed jobs free their files right away.
+    """
+
+    # How often the pruner thread looks for expired jobs
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, runner, max_workers=4, max_queue=32, per_host_limit=2, job_ttl=3600):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_host_limit = per_host_limit
+        self.job_ttl = job_ttl
+        self._jobs = {}
+        self._queue = []  # (finish tag, sequence, job)
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._client_tags = {}  # client -> finish tag of its last queued job
+        self._active_hosts = {}
+        self._active = 0
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def start(self):
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            pruner = threading.Thread(target=self._prune_periodically, name='job-pruner', daemon=True)
+            pruner.start()
+            self._workers.append(pruner)
+
+    def submit(self, kind, params, client=None, weight=1.0):
+        self.start()
+        self._prune()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise JobQueueFull(f'Job queue is full ({self.max_queue} waiting)')
+            job = Job(kind, params, client)
+            job.start_tag = max(self._virtual_time, self._client_tags.get(client, 0.0))
+            job.finish_tag = job.start_tag + 1.0 / weight
+            self._client_tags[client] = job.finish_tag
+            self._jobs[job.id] = job
+            bisect.insort(self._queue, (job.finish_tag, next(self._sequence), job))
+            self._cond.notify()
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        with self._cond:
+            for position, (_, _, queued) in enumerate(self._queue):
+                if queued is job:
+                    return position
+            return None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'active': self._active,
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'per_host_limit': self.per_host_limit,
+                'queued_clients': len({job.client for _, _, job in self._queue}),
+                'jobs': len(self._jobs)
+            }
+
+    def _next_job(self):
+        # Caller must hold self._cond
+        for index, (_, _, job) in enumerate(self._queue):
+            if self._active_hosts.get(job.host, 0) < self.per_host_limit:
+                del self._queue[index]
+                self._virtual_time = max(self._virtual_time, job.start_tag)
+                # Tags at or behind virtual time no longer affect new jobs
+                self._client_tags = {
+                    client: tag for client, tag in self._client_tags.items() if tag > self._virtual_time
+                }
+                return job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._active += 1
+                self._active_hosts[job.host] = self._active_hosts.get(job.host, 0) + 1
+                job.status = 'running'
+                job.started = time.time()
+
+            try:
+                job.result = self.runner(job)
+                job.status = 'finished'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'error'
+                # Partial downloads would count against the scratch quota until the job expired
+                if job.scratch is not None:
+                    job.scratch.release()
+            finally:
+                job.finished = time.time()
+                with self._cond:
+                    self._active -= 1
+                    self._active_hosts[job.host] -= 1
+                    if not self._active_hosts[job.host]:
+                        del self._active_hosts[job.host]
+                    # A host slot opened up, so a skipped job may now be runnable
+                    self._cond.notify_all()
+
+    def _prune_periodically(self):
+        while True:
+            time.sleep(min(self.PRUNE_INTERVAL, self.job_ttl))
+            self._prune()
+
+    def _prune(self):
+        """Forget finished jobs older than job_ttl and delete their files"""
+        cutoff = time.time() - self.job_ttl
+        with self._cond:
+            expired = [job for job in self._jobs.values() if job.finished and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.scratch is not None:
+                job.scratch.release()
+
+
+def create_job_manager(runner):
+    """Build the process-wide job manager from environment configuration"""
+    return JobManager(
+        runner,
+        max_workers=int(os.environ.get('JOB_WORKERS', 4)),
+        max_queue=int(os.environ.get('JOB_QUEUE_SIZE', 32)),
+        per_host_limit=int(os.environ.get('JOB_PER_HOST', 2)),
+        job_ttl=int(os.environ.get('JOB_TTL', 3600))
+    )
@@ -0,0 +1,66 @@
+import logging
+import os
+import re
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+# (URL pattern, oEmbed endpoint, yt-dlp extractor name) for sites whose oEmbed answers
+# in one cheap request, long before a full extraction resolves any formats
+OEMBED_PROVIDERS = (
+    (re.compile(r'https?://(?:(?:www|m|music)\.)?youtube\.com/(?:watch|shorts/|live/)|https?://youtu\.be/'),
+     'https://www.youtube.com/oembed', 'youtube'),
+    (re.compile(r'https?://(?:www\.|player\.)?vimeo\.com/(?:video/)?\d+'),
+     'https://vimeo.com/api/oembed.json', 'vimeo'),
+    (re.compile(r'https?://(?:www\.)?dailymotion\.com/video/|https?://dai\.ly/'),
+     'https://www.dailymotion.com/services/oembed', 'dailymotion'),
+    (re.compile(r'https?://(?:www\.|m\.)?soundcloud\.com/[^/]+/[^/?#]+'),
+     'https://soundcloud.com/oembed', 'soundcloud'),
+    (re.compile(r'https?://(?:www\.)?tiktok\.com/@[^/]+/video/\d+'),
+     'https://www.tiktok.com/oembed', 'TikTok'),
+)
+
+# oEmbed is only worth it while it is much faster than a full extraction
+OEMBED_TIMEOUT = float(os.environ.get('OEMBED_TIMEOUT', 2))
+
+
+def oembed_endpoint(url):
+    """(endpoint, extractor name) for url, or None if its site has no known oEmbed endpoint"""
+    for pattern, endpoint, extractor in OEMBED_PROVIDERS:
+        if pattern.match(url):
+            return endpoint, extractor
+    return None
+
+
+def fetch_oembed(session, url, timeout=OEMBED_TIMEOUT):
+    """Card metadata for url from its site's oEmbed endpoint, or None.
+
+    Returns the same keys as an info dict (title, uploader, duration,
+    thumbnail, ...), with None for whatever the site doesn't report;
+    YouTube's oEmbed has no duration, for example. Any failure returns
+    None so the caller can fall back to yt-dlp.
+    """
+    provider = oembed_endpoint(url)
+    if provider is None:
+        return None
+    endpoint, extractor = provider
+    try:
+        response = session.get(f"{endpoint}?{urlencode({'url': url, 'format': 'json'})}", timeout=timeout)
+        if response.status_code != 200:
+            logger.debug("oEmbed for %s returned HTTP %s", url, response.status_code)
+            return None
+        data = response.json()
+    except Exception as e:
+        logger.debug("oEmbed for %s failed: %s", url, e)
+        return None
+    if not isinstance(data, dict) or not data.get('title'):
+        return None
+    return {
+        'id': str(data['video_id']) if data.get('video_id') else None,
+        'title': data['title'],
+        'uploader': data.get('author_name'),
+        'duration': data.get('duration'),
+        'thumbnail': data.get('thumbnail_url'),
+        'extractor': extractor,
+        'webpage_url': url
+    }
@@ -0,0 +1,83 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that keeps stacks only for requests slower than a threshold.
+
+    One background thread samples the stacks of all threads currently
+    serving a request every ``interval`` seconds. When a request ends after
+    ``threshold`` seconds or more, its samples are written to ``directory``
+    in the folded format read by flamegraph.pl and speedscope
+    (``frame;frame;frame count`` per line); otherwise they are dropped.
+    """
+
+    def __init__(self, threshold, directory, interval=0.005, max_depth=64):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self.max_depth = max_depth
+        self._samples = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self.captured = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def begin(self):
+        """Start sampling the calling thread"""
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def end(self, label, duration):
+        """Stop sampling the calling thread; returns the profile path if one was written"""
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if not samples or duration < self.threshold:
+            return None
+        safe_label = re.sub(r'[^\w.-]+', '_', label)[:60]
+        path = os.path.join(self.directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_label}-{int(duration * 1000)}ms.folded')
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        with self._lock:
+            self.captured += 1
+        return path
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, counter in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_id:
+                        counter[self._fold(frame)] += 1
+
+    def _fold(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+
+def create_profiler():
+    """Profiler for requests slower than PROFILE_SLOW_REQUESTS seconds; None when unset"""
+    threshold = os.environ.get('PROFILE_SLOW_REQUESTS')
+    if not threshold:
+        return None
+    return SlowRequestProfiler(
+        float(threshold),
+        os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'mdownloader-profiles'),
+        interval=float(os.environ.get('PROFILE_INTERVAL', 0.005))
+    )
@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryProgressStore:
+    """In-process progress store with locking, TTL expiry and a size cap"""
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteProgressStore:
+    """Progress store in a SQLite WAL file shared by all workers on a host"""
+
+    # Expired rows are purged once every this many writes
+    PRUNE_EVERY = 200
+
+    def __init__(self, path, max_entries=1000, ttl=3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        db = self._connection()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS progress '
+            '(key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)'
+        )
+        db.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def set(self, key, value):
+        db = self._connection()
+        db.execute(
+            'INSERT OR REPLACE INTO progress (key, expires, value) VALUES (?, ?, ?)',
+            (key, time.time() + self.ttl, json.dumps(value))
+        )
+        db.commit()
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune(db)
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM progress WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, key):
+        db = self._connection()
+        db.execute('DELETE FROM progress WHERE key = ?', (key,))
+        db.commit()
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM progress').fetchone()[0]
+
+    def _prune(self, db):
+        db.execute('DELETE FROM progress WHERE expires <= ?', (time.time(),))
+        # Keep only the most recently updated rows when over the size cap
+        db.execute(
+            'DELETE FROM progress WHERE key NOT IN '
+            '(SELECT key FROM progress ORDER BY expires DESC LIMIT ?)', (self.max_entries,)
+        )
+        db.commit()
+
+
+def create_progress_store():
+    """Use a shared SQLite store when PROGRESS_STORE_PATH is set, otherwise in-memory"""
+    max_entries = int(os.environ.get('PROGRESS_STORE_SIZE', 1000))
+    ttl = int(os.environ.get('PROGRESS_STORE_TTL', 3600))
+    path = os.environ.get('PROGRESS_STORE_PATH')
+    if path:
+        return SQLiteProgressStore(path, max_entries=max_entries, ttl=ttl)
+    return MemoryProgressStore(max_entries=max_entries, ttl=ttl)
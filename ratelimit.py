@@ -0,0 +1,266 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# rate: tokens added per second, burst: bucket capacity
+Limit = namedtuple('Limit', 'rate burst')
+
+
+def parse_limit(spec):
+    """'30/60' -> 30 requests per 60 seconds with a burst of 30; None when empty or 0"""
+    if not spec or spec.strip() == '0':
+        return None
+    count, _, seconds = spec.partition('/')
+    count = float(count)
+    return Limit(count / float(seconds or 1), count)
+
+
+def refill(tokens, updated, limit, now):
+    """Bucket level at now, starting full for a bucket seen for the first time"""
+    if tokens is None:
+        return float(limit.burst)
+    return min(float(limit.burst), tokens + (now - updated) * limit.rate)
+
+
+def shortfall_wait(tokens, limit, cost):
+    """Seconds until a bucket holding tokens can pay cost (at most its burst); 0 if it can now"""
+    if tokens >= cost:
+        return 0.0
+    return (cost - tokens) / limit.rate
+
+
+class RateLimited(Exception):
+    """Raised when a request would overdraw one of its buckets"""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(f'Rate limit exceeded for {bucket}')
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Token buckets for one process"""
+
+    # Buckets idle for this long are forgotten once every PRUNE_EVERY takes
+    IDLE_TTL = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, charges, now=None):
+        """Charge every (key, limit, cost) or none of them.
+
+        Returns None on success, otherwise (key, seconds until it could pay).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            levels = []
+            for key, limit, cost in charges:
+                tokens = refill(*self._buckets.get(key, (None, now)), limit, now)
+                wait = shortfall_wait(tokens, limit, cost)
+                if wait:
+                    return key, wait
+                levels.append((key, tokens - cost))
+            for key, tokens in levels:
+                self._buckets[key] = (tokens, now)
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # An idle bucket has refilled, which is the same as a missing one
+                cutoff = now - self.IDLE_TTL
+                for key in [k for k, (_, updated) in self._buckets.items() if updated < cutoff]:
+                    del self._buckets[key]
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite WAL file shared by all workers on a host.
+
+    A take is one IMMEDIATE transaction, so concurrent workers can't both
+    spend the last token of a bucket.
+    """
+
+    # Buckets idle for this long are purged once every PRUNE_EVERY takes
+    IDLE_TTL = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._takes_lock = threading.Lock()
+        db = self._connection()
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+        db.commit()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def take(self, charges, now=None):
+        """Charge every (key, limit, cost) or none of them (see MemoryBucketStore.take)"""
+        now = time.time() if now is None else now
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            for key, limit, cost in charges:
+                row = db.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = refill(*(row or (None, now)), limit, now)
+                wait = shortfall_wait(tokens, limit, cost)
+                if wait:
+                    db.execute('ROLLBACK')
+                    return key, wait
+                levels.append((key, tokens - cost, now))
+            db.executemany('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', levels)
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        self._maybe_prune(db, now)
+        return None
+
+    def _maybe_prune(self, db, now):
+        with self._takes_lock:
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY:
+                return
+        db.execute('DELETE FROM buckets WHERE updated < ?', (now - self.IDLE_TTL,))
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM buckets').fetchone()[0]
+
+
+class RateLimiter:
+    """Per-client and per-extractor token buckets for each kind of request.
+
+    ``limits`` maps a request kind ('info', 'download') to a dict with
+    optional 'client' and 'extractor' Limits. Client buckets stop one
+    caller from using up the workers; extractor buckets are shared by all
+    callers and cap how hard we hit each upstream site, so its rate limits
+    don't get our egress IPs throttled.
+    """
+
+    # Unredeemed passes expire after this many seconds; at most MAX_PASSES are kept
+    PASS_TTL = 120
+    MAX_PASSES = 4096
+
+    def __init__(self, store, limits, enabled=True):
+        self.store = store
+        self.limits = limits
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = {}  # (kind, scope) -> count
+        self._passes = {}  # token -> (key, expires), in issue order
+
+    def check(self, kind, client, extractors):
+        """Charge a request of kind; raises RateLimited if any bucket is short.
+
+        extractors maps extractor name -> number of videos the request
+        covers (a batch counts each one); the client is charged the total.
+        A charge larger than a bucket's burst is capped at the burst, so a
+        big batch empties the bucket instead of never fitting.
+        """
+        if not self.enabled:
+            return
+        limits = self.limits.get(kind) or {}
+        charges = []
+        if limits.get('client') and client:
+            limit = limits['client']
+            charges.append((f'{kind}:client:{client}', limit, min(sum(extractors.values()) or 1, limit.burst)))
+        if limits.get('extractor'):
+            limit = limits['extractor']
+            charges += [
+                (f'{kind}:extractor:{name}', limit, min(count, limit.burst))
+                for name, count in extractors.items() if count
+            ]
+        denied = self.store.take(charges) if charges else None
+        with self._lock:
+            if denied is None:
+                self.allowed += 1
+                return
+            key, retry_after = denied
+            scope = key.split(':', 2)[1]
+            self.limited[(kind, scope)] = self.limited.get((kind, scope), 0) + 1
+        raise RateLimited(key, retry_after)
+
+    def issue_pass(self, key):
+        """Single-use token that lets one later request for key skip its charge.
+
+        For follow-ups to a request that was already charged (phase two of
+        /api/info/lite). Passes live in this process only; redeeming one in
+        another worker fails, and that request is charged as usual.
+        """
+        if not self.enabled:
+            return None
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        with self._lock:
+            for old in [t for t, (_, expires) in self._passes.items() if expires <= now]:
+                del self._passes[old]
+            while len(self._passes) >= self.MAX_PASSES:
+                del self._passes[next(iter(self._passes))]
+            self._passes[token] = (key, now + self.PASS_TTL)
+        return token
+
+    def redeem_pass(self, token, key):
+        """Whether token is an unexpired pass for key; a pass is only accepted once"""
+        if not token:
+            return False
+        with self._lock:
+            issued = self._passes.pop(token, None)
+        return issued is not None and issued[0] == key and issued[1] > time.time()
+
+    def stats(self):
+        with self._lock:
+            limited = dict(self.limited)
+            allowed = self.allowed
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.store).__name__,
+            'buckets': len(self.store),
+            'allowed': allowed,
+            'limited': {f'{kind}:{scope}': count for (kind, scope), count in limited.items()},
+            'limits': {
+                kind: {scope: {'per_second': round(limit.rate, 4), 'burst': limit.burst}
+                       for scope, limit in scopes.items() if limit}
+                for kind, scopes in self.limits.items()
+            }
+        }
+
+
+def create_rate_limiter():
+    """Limits from RATE_LIMIT_* ('count/seconds', 0 disables one); shared via SQLite when RATE_LIMIT_DB is set"""
+    limits = {
+        'info': {
+            'client': parse_limit(os.environ.get('RATE_LIMIT_INFO_CLIENT', '60/60')),
+            'extractor': parse_limit(os.environ.get('RATE_LIMIT_INFO_EXTRACTOR', '600/60'))
+        },
+        'download': {
+            'client': parse_limit(os.environ.get('RATE_LIMIT_DOWNLOAD_CLIENT', '12/60')),
+            'extractor': parse_limit(os.environ.get('RATE_LIMIT_DOWNLOAD_EXTRACTOR', '120/60'))
+        }
+    }
+    path = os.environ.get('RATE_LIMIT_DB')
+    store = SQLiteBucketStore(path) if path else MemoryBucketStore()
+    return RateLimiter(store, limits, enabled=os.environ.get('RATE_LIMIT', '1') != '0')
@@ -201,7 +201,8 @@ class RecentDownloads {
 
             // Set action and add type-specific parameters
             if (download.type === 'video') {
-                form.action = API_CONFIG.getApiUrl('/api/download/video');
+                form.method = 'GET';
+                form.action = API_CONFIG.getApiUrl('/api/download/stream');
                 
                 const formatIdInput = document.createElement('input');
                 formatIdInput.name = 'format_id';
@@ -319,8 +320,8 @@ class RecentDownloads {
         if (!imgElement.dataset.proxyTried && originalUrl && !originalUrl.startsWith('/api/')) {
             imgElement.dataset.proxyTried = 'true';
             
-            // Try proxy
-            const proxyUrl = API_CONFIG.getApiUrl(`/api/thumbnail/proxy?url=${encodeURIComponent(originalUrl)}`);
+            // Try proxy; items are shown at 64px, so 128px covers high-DPI screens
+            const proxyUrl = API_CONFIG.getApiUrl(`/api/thumbnail/proxy?url=${encodeURIComponent(originalUrl)}&w=128`);
             imgElement.onerror = () => {
                 // Final fallback to placeholder
                 imgElement.src = API_CONFIG.getApiUrl(`/api/thumbnail/placeholder?platform=${extractor || 'unknown'}`);
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+
+class InsufficientStorage(Exception):
+    """Raised instead of starting a download that the scratch space can't hold"""
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class ScratchDir:
+    """A download's working directory, created on first use and removed by release()"""
+
+    def __init__(self, space):
+        self.space = space
+        self._path = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = self.space._allocate()
+        return self._path
+
+    def release(self):
+        if self._path is not None:
+            self.space._release(self._path)
+            self._path = None
+
+
+class ScratchSpace:
+    """Per-deployment root for download temp dirs with a byte quota.
+
+    Every download gets its own ``<pid>-<id>`` directory below the root. A
+    new directory is refused with InsufficientStorage when the root already
+    holds quota_bytes or the filesystem has less than min_free_bytes free.
+    Directories whose worker process is gone, or that are older than
+    max_age, are removed by sweep().
+    """
+
+    def __init__(self, root, quota_bytes=4 * 1024 ** 3, min_free_bytes=512 * 1024 ** 2, max_age=6 * 3600):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.max_age = max_age
+        self._active = set()
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.released = 0
+        self.refused = 0
+        self.swept = 0
+        os.makedirs(root, exist_ok=True)
+
+    def reserve(self):
+        return ScratchDir(self)
+
+    def check(self):
+        """Raise InsufficientStorage if a new download should not start now"""
+        free = shutil.disk_usage(self.root).free
+        if free < self.min_free_bytes:
+            self._refuse(f'Only {free // (1024 * 1024)} MiB of disk space left')
+        if self.quota_bytes and _dir_size(self.root) >= self.quota_bytes:
+            self._refuse('Download scratch space quota exceeded')
+
+    def sweep(self):
+        """Remove directories left behind by crashed workers or older than max_age"""
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            with self._lock:
+                if path in self._active:
+                    continue
+            try:
+                pid = int(name.split('-', 1)[0])
+            except ValueError:
+                pid = None
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if pid is None or not _pid_alive(pid) or mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        with self._lock:
+            self.swept += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            active = list(self._active)
+            data = {
+                'root': self.root,
+                'quota_bytes': self.quota_bytes,
+                'min_free_bytes': self.min_free_bytes,
+                'active_dirs': len(active),
+                'allocated': self.allocated,
+                'released': self.released,
+                'refused': self.refused,
+                'swept': self.swept
+            }
+        data['bytes_in_flight'] = sum(_dir_size(path) for path in active)
+        data['free_bytes'] = shutil.disk_usage(self.root).free
+        return data
+
+    def _refuse(self, message):
+        with self._lock:
+            self.refused += 1
+        raise InsufficientStorage(message)
+
+    def _allocate(self):
+        self.check()
+        path = os.path.join(self.root, f'{os.getpid()}-{uuid.uuid4().hex[:12]}')
+        os.mkdir(path)
+        with self._lock:
+            self._active.add(path)
+            self.allocated += 1
+        return path
+
+    def _release(self, path):
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            if path in self._active:
+                self._active.discard(path)
+                self.released += 1
+
+
+def create_scratch_space():
+    """Build the scratch space from environment configuration and sweep orphans from earlier runs"""
+    space = ScratchSpace(
+        os.environ.get('SCRATCH_DIR') or os.path.join(tempfile.gettempdir(), 'mdownloader-scratch'),
+        quota_bytes=int(os.environ.get('SCRATCH_QUOTA_BYTES', 4 * 1024 ** 3)),
+        min_free_bytes=int(os.environ.get('SCRATCH_MIN_FREE_BYTES', 512 * 1024 ** 2)),
+        max_age=int(os.environ.get('SCRATCH_MAX_AGE', 6 * 3600))
+    )
+    space.sweep()
+    return space
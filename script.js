@@ -149,33 +149,93 @@ class YouTubeDownloader {
         this.hideVideoInfo();
 
         try {
-            const requestBody = JSON.stringify({ url: url });
-            const apiUrl = API_CONFIG.getApiUrl('/api/info');
-            
-            const response = await fetch(apiUrl, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: requestBody
-            });
-
-            const data = await response.json();
-
-            if (!response.ok) {
-                throw new Error(data.error || 'Failed to fetch video information');
-            }
+            const data = await this.fetchInfoInPhases(url);
 
+            // Ignore a late answer for a URL the user has moved on from
+            if (this.currentUrl !== url) return;
             this.currentVideoInfo = data;
             this.displayVideoInfo(data);
             this.hideLoading();
 
         } catch (error) {
+            if (this.currentUrl !== url) return;
             this.hideLoading();
+            this.hideVideoInfo();
             this.showError(error.message);
         }
     }
 
+    fetchInfoInPhases(url) {
+        // Both phases arrive over one request, so a serverless deployment can't
+        // route the second half to another instance that extracts all over again
+        if (typeof EventSource === 'undefined') {
+            return this.fetchFullInfo(url);
+        }
+
+        return new Promise((resolve, reject) => {
+            const events = new EventSource(
+                API_CONFIG.getApiUrl('/api/info/lite/events?url=' + encodeURIComponent(url))
+            );
+
+            events.addEventListener('lite', (event) => {
+                // Render the card from lightweight metadata while formats resolve
+                if (this.currentUrl !== url) return;
+                this.displayLiteInfo(JSON.parse(event.data));
+                this.hideLoading();
+            });
+
+            events.addEventListener('full', (event) => {
+                events.close();
+                resolve(JSON.parse(event.data));
+            });
+
+            events.addEventListener('error', (event) => {
+                events.close();
+                if (event.data) {
+                    const data = JSON.parse(event.data);
+                    reject(new Error(data.error || 'Failed to fetch video information'));
+                } else {
+                    // The stream itself failed (rate limited, proxy buffering, dropped
+                    // connection): the plain endpoint reports errors properly
+                    this.fetchFullInfo(url).then(resolve, reject);
+                }
+            });
+        });
+    }
+
+    async fetchFullInfo(url) {
+        const response = await fetch(API_CONFIG.getApiUrl('/api/info'), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ url: url })
+        });
+
+        const data = await response.json();
+
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to fetch video information');
+        }
+        return data;
+    }
+
+    displayLiteInfo(data) {
+        const info = data.info;
+        
+        document.getElementById('video-title').textContent = info.title || 'Unknown Title';
+        document.getElementById('video-uploader').textContent = `By: ${info.uploader || 'Unknown Uploader'}`;
+        document.getElementById('video-duration').textContent = `Duration: ${this.formatDuration(info.duration)}`;
+        
+        const thumbnailImg = document.getElementById('video-thumbnail');
+        this.setThumbnailWithFallback(thumbnailImg, info.thumbnail, info.extractor);
+
+        document.getElementById('video-formats-grid').innerHTML = '<p class="no-formats">Loading available qualities...</p>';
+        document.getElementById('audio-formats-grid').innerHTML = '<p class="no-formats">Loading available qualities...</p>';
+
+        this.showVideoInfo();
+    }
+
     displayVideoInfo(data) {
         // Store video info for use in other methods
         this.videoInfo = data;
@@ -307,8 +367,8 @@ class YouTubeDownloader {
         };
         
         imgElement.onerror = () => {
-            // Try proxy
-            const proxyUrl = API_CONFIG.getApiUrl(`/api/thumbnail/proxy?url=${encodeURIComponent(thumbnailUrl)}`);
+            // Try proxy, asking for a card-sized image (the server picks WebP/AVIF from our Accept header)
+            const proxyUrl = API_CONFIG.getApiUrl(`/api/thumbnail/proxy?url=${encodeURIComponent(thumbnailUrl)}&w=640`);
             imgElement.onerror = () => {
                 // Final fallback to placeholder
                 imgElement.src = API_CONFIG.getApiUrl(`/api/thumbnail/placeholder?platform=${extractor || 'unknown'}`);
@@ -326,9 +386,11 @@ class YouTubeDownloader {
         
         try {
             // Create a form to submit the download request directly
+            // GET to the stream endpoint so progressive formats start immediately
+            // and browsers/download managers can resume with Range requests
             const form = document.createElement('form');
-            form.method = 'POST';
-            form.action = API_CONFIG.getApiUrl('/api/download/video');
+            form.method = 'GET';
+            form.action = API_CONFIG.getApiUrl('/api/download/stream');
             form.style.display = 'none';
             
             // Add form data
@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Don't split files into ranges smaller than this
+MIN_SEGMENT_BYTES = 1024 * 1024
+SEGMENT_CHUNK_SIZE = 64 * 1024
+# Attempts per segment; a retry resumes where the previous attempt stopped
+SEGMENT_ATTEMPTS = 3
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+)')
+
+
+class SegmentedFetchError(Exception):
+    """A segmented download that could not be completed"""
+
+
+def probe_size(session, url, headers, timeout=(10, 30)):
+    """Return the total size if the server honours byte ranges, else None"""
+    response = session.get(url, headers=dict(headers, Range='bytes=0-0'), stream=True, timeout=timeout)
+    try:
+        if response.status_code != 206:
+            return None
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        return int(match.group(3)) if match else None
+    finally:
+        response.close()
+
+
+def fetch_segmented(session, url, headers, path, segments, progress_hooks=(), timeout=(10, 30)):
+    """Download url into path over several parallel Range requests.
+
+    Returns the number of bytes written, or None when the server does not
+    support ranges (the caller should fall back to a single stream). Calls
+    progress_hooks with yt-dlp style progress dicts, so ProgressHook and
+    SegmentTuner.hook work unchanged.
+    """
+    total = probe_size(session, url, headers, timeout)
+    if not total:
+        return None
+    segments = max(1, min(segments, total // MIN_SEGMENT_BYTES))
+    bounds = [(total * i // segments, total * (i + 1) // segments - 1) for i in range(segments)]
+
+    lock = threading.Lock()
+    state = {'downloaded': 0}
+    start = time.monotonic()
+
+    def report(status):
+        elapsed = time.monotonic() - start
+        downloaded = state['downloaded']
+        speed = downloaded / elapsed if elapsed > 0 else None
+        progress = {
+            'status': status,
+            'filename': path,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'elapsed': elapsed,
+            'speed': speed,
+            'eta': (total - downloaded) / speed if speed else None,
+            'segments': segments
+        }
+        for hook in progress_hooks:
+            hook(progress)
+
+    def fetch(first, last):
+        offset = first
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            for attempt in range(SEGMENT_ATTEMPTS):
+                try:
+                    response = session.get(url, headers=dict(headers, Range=f'bytes={offset}-{last}'),
+                                            stream=True, timeout=timeout)
+                    with response:
+                        if response.status_code != 206:
+                            raise SegmentedFetchError(f'Range request returned HTTP {response.status_code}')
+                        for chunk in response.iter_content(SEGMENT_CHUNK_SIZE):
+                            chunk = chunk[:last + 1 - offset]
+                            os.pwrite(fd, chunk, offset)
+                            offset += len(chunk)
+                            with lock:
+                                state['downloaded'] += len(chunk)
+                                report('downloading')
+                            if offset > last:
+                                return
+                except (OSError, SegmentedFetchError) as e:
+                    # requests' ConnectionError/Timeout are OSErrors too
+                    if attempt == SEGMENT_ATTEMPTS - 1:
+                        raise SegmentedFetchError(f'Segment {first}-{last} failed: {e}') from e
+                if offset > last:
+                    return
+            raise SegmentedFetchError(f'Segment {first}-{last} ended early at byte {offset}')
+        finally:
+            os.close(fd)
+
+    with open(path, 'wb') as f:
+        f.truncate(total)
+    with ThreadPoolExecutor(max_workers=segments, thread_name_prefix='segment') as pool:
+        for future in [pool.submit(fetch, first, last) for first, last in bounds]:
+            future.result()
+    report('finished')
+    return total
+
+
+class SegmentTuner:
+    """Picks a segment count per host from the throughput of earlier downloads.
+
+    Keeps a moving average of bytes/second for each segment count tried on a
+    host, settles on the best one and probes the next higher count (up to
+    max_segments) whenever the best is also the highest tried so far.
+    """
+
+    def __init__(self, initial=4, max_segments=8, smoothing=0.3):
+        self.initial = min(initial, max_segments)
+        self.max_segments = max_segments
+        self.smoothing = smoothing
+        self._throughput = {}  # host -> {segments: bytes per second}
+        self._lock = threading.Lock()
+
+    def segments(self, host):
+        with self._lock:
+            measured = self._throughput.get(host)
+            if not measured:
+                return self.initial
+            best = max(measured, key=measured.get)
+            higher = min(best * 2, self.max_segments)
+            if higher not in measured and best == max(measured):
+                return higher
+            return best
+
+    def record(self, host, segments, throughput):
+        with self._lock:
+            measured = self._throughput.setdefault(host, {})
+            previous = measured.get(segments)
+            measured[segments] = throughput if previous is None else (
+                previous + self.smoothing * (throughput - previous)
+            )
+
+    def hook(self, host, segments):
+        """Progress hook that records the throughput reported when a download finishes.
+
+        Throughput is recorded under the segment count actually used, which
+        fetch_segmented lowers for files too small to split that many ways.
+        """
+        def on_progress(d):
+            if d.get('status') == 'finished' and d.get('elapsed') and d.get('total_bytes'):
+                self.record(host, d.get('segments', segments), d['total_bytes'] / d['elapsed'])
+        return on_progress
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {str(n): round(tp) for n, tp in sorted(measured.items())}
+                for host, measured in self._throughput.items()
+            }
+
+
+def create_segment_tuner():
+    """Build the per-host segment tuner from environment configuration"""
+    return SegmentTuner(
+        initial=int(os.environ.get('DOWNLOAD_SEGMENTS', 4)),
+        max_segments=int(os.environ.get('DOWNLOAD_MAX_SEGMENTS', 8))
+    )
@@ -0,0 +1,99 @@
+"""get_cookies.py against a synthetic Firefox cookies.sqlite"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_cookies import export_firefox_cookies, get_firefox_cookies
+
+# (host, path, isSecure, isHttpOnly, expiry, name, value)
+COOKIES = [
+    ('.youtube.com', '/', 1, 1, 1893456000, 'SID', 'sid-value'),
+    ('www.youtube.com', '/watch', 0, 0, 1893456000 * 1000, 'PREF', 'f6=40000000'),
+    ('.google.com', '/', 1, 0, 1893456000, 'NID', 'nid-value'),
+    ('notyoutube.com', '/', 0, 0, 1893456000, 'EVIL', 'should-not-export'),
+]
+
+
+@pytest.fixture
+def profile(tmp_path):
+    db = sqlite3.connect(tmp_path / 'cookies.sqlite')
+    db.execute(
+        'CREATE TABLE moz_cookies (id INTEGER PRIMARY KEY, originAttributes TEXT NOT NULL DEFAULT "", '
+        'name TEXT, value TEXT, host TEXT, path TEXT, expiry INTEGER, lastAccessed INTEGER, '
+        'creationTime INTEGER, isSecure INTEGER, isHttpOnly INTEGER)'
+    )
+    db.executemany(
+        'INSERT INTO moz_cookies (host, path, isSecure, isHttpOnly, expiry, name, value) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        COOKIES
+    )
+    db.commit()
+    db.close()
+    return tmp_path
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read().split('\n')
+
+
+def cookie_lines(lines):
+    return [line for line in lines if line and (not line.startswith('#') or line.startswith('#HttpOnly_'))]
+
+
+def test_exports_requested_domains_only(profile, tmp_path):
+    output = tmp_path / 'cookies.txt'
+    count = export_firefox_cookies(str(profile), ['youtube.com', '.google.com'], str(output))
+
+    assert count == 3
+    names = {line.split('\t')[5] for line in cookie_lines(read_lines(output))}
+    assert names == {'SID', 'PREF', 'NID'}
+
+
+def test_netscape_format(profile, tmp_path):
+    output = tmp_path / 'cookies.txt'
+    export_firefox_cookies(str(profile), ['youtube.com'], str(output))
+
+    raw = output.read_bytes()
+    assert b'\\t' not in raw and b'\\n' not in raw
+    assert b'\r\n' not in raw
+    lines = {line.split('\t')[5]: line.split('\t') for line in cookie_lines(read_lines(output))}
+    assert all(len(fields) == 7 for fields in lines.values())
+    assert lines['SID'] == ['#HttpOnly_.youtube.com', 'TRUE', '/', 'TRUE', '1893456000', 'SID', 'sid-value']
+    # Millisecond expiry is normalized to seconds
+    assert lines['PREF'] == ['www.youtube.com', 'FALSE', '/watch', 'FALSE', '1893456000', 'PREF', 'f6=40000000']
+
+
+def test_reads_locked_database(profile):
+    # Firefox keeps an exclusive lock on cookies.sqlite while it runs
+    lock = sqlite3.connect(profile / 'cookies.sqlite', isolation_level=None)
+    lock.execute('PRAGMA locking_mode=EXCLUSIVE')
+    lock.execute('BEGIN EXCLUSIVE')
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            sqlite3.connect(profile / 'cookies.sqlite', timeout=0).execute('SELECT COUNT(*) FROM moz_cookies').fetchone()
+        text = get_firefox_cookies(str(profile), '.youtube.com')
+    finally:
+        lock.execute('ROLLBACK')
+        lock.close()
+
+    assert text is not None
+    assert len(cookie_lines(text.split('\n'))) == 2
+
+
+def test_output_loads_in_yt_dlp(profile, tmp_path):
+    cookies = pytest.importorskip('yt_dlp.cookies')
+    output = tmp_path / 'cookies.txt'
+    export_firefox_cookies(str(profile), ['youtube.com', 'google.com'], str(output))
+
+    jar = cookies.YoutubeDLCookieJar(str(output))
+    jar.load()
+    loaded = {(cookie.domain, cookie.name) for cookie in jar}
+    assert loaded == {('.youtube.com', 'SID'), ('www.youtube.com', 'PREF'), ('.google.com', 'NID')}
+
+
+def test_missing_profile_returns_none(tmp_path):
+    assert export_firefox_cookies(str(tmp_path / 'missing'), ['youtube.com'], str(tmp_path / 'out.txt')) is None
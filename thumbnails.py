@@ -0,0 +1,301 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from lazy import LazyModule, module_available
+
+# Pillow is imported on the first resize. Resizing is disabled without it;
+# the proxy passes originals through
+HAS_PILLOW = module_available('PIL')
+Image = LazyModule('PIL.Image')
+features = LazyModule('PIL.features')
+
+# Output formats we can encode, best compression first
+IMAGE_FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png')
+}
+
+# Largest derived image edge, so arbitrary sizes can't blow up the cache
+MAX_DERIVED_EDGE = 1280
+
+
+def can_resize():
+    return HAS_PILLOW
+
+
+def supported_formats():
+    if not HAS_PILLOW:
+        return set()
+    formats = {'jpeg', 'png'}
+    for name in ('webp', 'avif'):
+        if features.check(name):
+            formats.add(name)
+    return formats
+
+
+def negotiate_format(requested, accept_header):
+    """Pick the output format from an explicit request or the client's Accept header"""
+    available = supported_formats()
+    if requested and requested != 'auto':
+        requested = 'jpeg' if requested == 'jpg' else requested
+        return requested if requested in available else None
+    accept = (accept_header or '').lower()
+    for name in ('avif', 'webp'):
+        if name in available and f'image/{name}' in accept:
+            return name
+    return 'jpeg'
+
+
+def clamp_dimension(value):
+    """Parse a width/height parameter; None when absent or invalid"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return max(1, min(value, MAX_DERIVED_EDGE)) if value > 0 else None
+
+
+def resize_image(source_path, width, height, fmt, quality=80):
+    """Shrink an image to fit within width x height and encode it as fmt"""
+    pil_format, _ = IMAGE_FORMATS[fmt]
+    with Image.open(source_path) as img:
+        img.thumbnail((width or MAX_DERIVED_EDGE, height or MAX_DERIVED_EDGE))
+        if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode == 'P':
+            img = img.convert('RGBA')
+        output = io.BytesIO()
+        img.save(output, pil_format, quality=quality)
+    return output.getvalue()
+
+
+def create_http_session():
+    """Shared requests.Session with a connection pool sized for parallel proxying"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=int(os.environ.get('HTTP_POOL_CONNECTIONS', 32)),
+        pool_maxsize=int(os.environ.get('HTTP_POOL_MAXSIZE', 64)),
+        max_retries=Retry(
+            total=2, backoff_factor=0.2,
+            status_forcelist=(502, 503, 504), allowed_methods=('GET', 'HEAD')
+        )
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _CacheWriter:
+    """Accumulates a streamed response into a temp file until it is committed"""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        self.digest = hashlib.sha1()
+        self.tmp_path = os.path.join(cache.directory, f'.{key}.{uuid.uuid4().hex}.tmp')
+        self.file = open(self.tmp_path, 'wb')
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self, meta):
+        self.file.close()
+        meta = dict(meta, etag=self.digest.hexdigest(), size=self.size, fetched=time.time())
+        self.cache._commit(self.key, self.tmp_path, meta)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class ThumbnailCache:
+    """Byte-bounded LRU disk cache of proxied thumbnails keyed by URL.
+
+    Each entry is a ``<key>.bin`` body plus a ``<key>.json`` metadata file
+    holding the content type, the upstream validators used to revalidate
+    it and a strong ETag of the body for conditional requests from clients.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, max_age=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._index = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url):
+        """Return (meta, body_path) for a cached URL, or None"""
+        key = self.key(url)
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        meta = self._read_meta(key)
+        if meta is None:
+            self._forget(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return meta, self._body_path(key)
+
+    def is_fresh(self, meta):
+        return meta.get('fetched', 0) + self.max_age > time.time()
+
+    def refresh(self, url, meta):
+        """Mark an entry fresh again after a 304 from upstream"""
+        key = self.key(url)
+        meta = dict(meta, fetched=time.time())
+        self._write_meta(key, meta)
+        with self._lock:
+            self.revalidated += 1
+        return meta
+
+    def writer(self, url):
+        return _CacheWriter(self, self.key(url))
+
+    def put(self, url, body, meta):
+        """Store a complete body in one go"""
+        writer = self.writer(url)
+        writer.write(body)
+        writer.commit(meta)
+        return self.get(url)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._index),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated
+            }
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        tmp_path = f'{self._meta_path(key)}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def _commit(self, key, tmp_path, meta):
+        if meta['size'] > self.max_bytes:
+            os.remove(tmp_path)
+            return
+        os.replace(tmp_path, self._body_path(key))
+        self._write_meta(key, meta)
+        with self._lock:
+            self._bytes += meta['size'] - self._index.get(key, 0)
+            self._index[key] = meta['size']
+            self._index.move_to_end(key)
+            evicted = []
+            while self._bytes > self.max_bytes and self._index:
+                old_key, size = self._index.popitem(last=False)
+                self._bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._remove_files(old_key)
+
+    def _forget(self, key):
+        with self._lock:
+            size = self._index.pop(key, None)
+            if size is not None:
+                self._bytes -= size
+        self._remove_files(key)
+
+    def _remove_files(self, key):
+        for path in (self._body_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load_index(self):
+        """Rebuild the LRU order from files left by a previous run (oldest access first)"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif name.endswith('.bin'):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+
+
+def thumbnail_cache_dir():
+    return os.environ.get('THUMBNAIL_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'mdownloader-thumbnails')
+
+
+def create_thumbnail_cache():
+    """Build the thumbnail cache from environment configuration"""
+    return ThumbnailCache(
+        thumbnail_cache_dir(),
+        max_bytes=int(os.environ.get('THUMBNAIL_CACHE_BYTES', 64 * 1024 * 1024)),
+        max_age=int(os.environ.get('THUMBNAIL_CACHE_MAX_AGE', 3600))
+    )
+
+
+def create_derived_cache():
+    """Cache of resized/re-encoded thumbnails, keyed by source content hash and parameters.
+
+    Entries are content-addressed and never go stale, so only the byte
+    budget evicts them.
+    """
+    return ThumbnailCache(
+        os.path.join(thumbnail_cache_dir(), 'derived'),
+        max_bytes=int(os.environ.get('DERIVED_CACHE_BYTES', 32 * 1024 * 1024)),
+        max_age=365 * 24 * 3600
+    )
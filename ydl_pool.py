@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from lazy import LazyModule
+
+yt_dlp = LazyModule('yt_dlp')
+
+
+def options_fingerprint(opts):
+    """Stable key for a yt-dlp options dict"""
+    return hashlib.sha1(json.dumps(opts, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+class YDLPool:
+    """Reusable, pre-warmed YoutubeDL instances keyed by an options fingerprint.
+
+    Building a YoutubeDL registers every extractor, loads the cookie jar and
+    creates fresh HTTP handlers (losing pooled TLS connections). Instances
+    checked out from the pool keep all of that between requests. An instance
+    is used by one request at a time, reset before it goes back, and closed
+    after max_uses checkouts or when the request using it raised. At most
+    max_idle instances are kept per fingerprint and max_total_idle overall;
+    past that, idle instances of the least recently used fingerprint are
+    closed first. prepare,
+    if given, is called with every instance on checkout (e.g. to attach
+    shared state that can change between requests). factory defaults to
+    yt_dlp.YoutubeDL, imported when the first instance is built.
+    """
+
+    def __init__(self, max_idle=4, max_uses=100, enabled=True, factory=None, prepare=None, max_total_idle=16):
+        self.max_idle = max_idle
+        self.max_total_idle = max_total_idle
+        self.max_uses = max_uses
+        self.enabled = enabled
+        self.factory = factory
+        self.prepare = prepare
+        self._idle = OrderedDict()  # fingerprint -> [(ydl, uses), ...], least recently released first
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    @contextmanager
+    def checkout(self, opts):
+        key = options_fingerprint(opts)
+        ydl, uses = self._acquire(key, opts)
+        ok = False
+        try:
+            if self.prepare is not None:
+                self.prepare(ydl)
+            yield ydl
+            ok = True
+        finally:
+            self._release(key, ydl, uses + 1, ok)
+
+    def warm(self, opts, count=1):
+        """Create idle instances ahead of the first request (e.g. at worker boot)"""
+        if not self.enabled:
+            return
+        key = options_fingerprint(opts)
+        for _ in range(count):
+            ydl = self._create(opts)
+            self._release(key, ydl, 0, True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'idle': self._idle_count,
+                'fingerprints': len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled
+            }
+
+    def _create(self, opts):
+        with self._lock:
+            self.created += 1
+        # YoutubeDL keeps a reference to the dict it was given, so hand it a copy
+        factory = self.factory or yt_dlp.YoutubeDL
+        return factory(dict(opts))
+
+    def _acquire(self, key, opts):
+        if self.enabled:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    self.reused += 1
+                    self._idle_count -= 1
+                    entry = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+                    return entry
+        return self._create(opts), 0
+
+    def _release(self, key, ydl, uses, ok):
+        # With ignoreerrors yt-dlp reports failures through the retcode instead of raising
+        ok = ok and not ydl._download_retcode
+        evicted = [ydl]
+        if self.enabled and ok and uses < self.max_uses:
+            self._reset(ydl)
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                self._idle.move_to_end(key)
+                if len(idle) < self.max_idle:
+                    idle.append((ydl, uses))
+                    self._idle_count += 1
+                    evicted = self._evict()
+        with self._lock:
+            self.recycled += len(evicted)
+        for old in evicted:
+            try:
+                old.close()
+            except Exception:
+                pass
+
+    def _evict(self):
+        """Pop idle instances beyond max_total_idle, least recently used fingerprint first"""
+        # Caller must hold self._lock
+        evicted = []
+        while self._idle_count > self.max_total_idle:
+            key, idle = next(iter(self._idle.items()))
+            evicted.append(idle.pop(0)[0])
+            self._idle_count -= 1
+            if not idle:
+                del self._idle[key]
+        return evicted
+
+    @staticmethod
+    def _reset(ydl):
+        """Clear the per-run counters a previous request may have left behind"""
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+        ydl._printed_messages = set()
+
+
+@contextmanager
+def format_selection(ydl, format_spec):
+    """Select formats with format_spec on ydl for the duration of the block.
+
+    Lets a pooled instance serve any client-chosen selector, instead of
+    every selector getting instances of its own. Raises SyntaxError for
+    an invalid spec.
+    """
+    previous = ydl.format_selector
+    ydl.format_selector = ydl.build_format_selector(format_spec)
+    try:
+        yield ydl
+    finally:
+        ydl.format_selector = previous
+
+
+def create_ydl_pool(prepare=None):
+    """Build the process-wide YoutubeDL pool from environment configuration"""
+    return YDLPool(
+        max_idle=int(os.environ.get('YDL_POOL_SIZE', 4)),
+        max_total_idle=int(os.environ.get('YDL_POOL_TOTAL', 16)),
+        max_uses=int(os.environ.get('YDL_POOL_MAX_USES', 100)),
+        enabled=os.environ.get('YDL_POOL', '1') != '0',
+        prepare=prepare
+    )